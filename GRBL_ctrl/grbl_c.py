@@ -1,17 +1,41 @@
 # grbl_controller.py
+import collections
+import select
 import serial
 import time
+from typing import Callable, Optional
+
+
+# GRBL 串口接收缓冲 128 字节，留一点余量
+RX_BUFFER_SIZE = 112
+
+# wait_idle 轮询 '?' 的间隔：刚开始快，长时间运动时逐渐放慢
+STATUS_BACKOFF_S = (0.02, 0.02, 0.05, 0.1, 0.2, 0.5)
 
 
 class GrblController:
-    def __init__(self, port="/dev/ttyUSB0", baudrate=115200, timeout=1.0):
+    def __init__(self, port="/dev/ttyUSB0", baudrate=115200, timeout=1.0, response_timeout=180.0,
+                 idle_callback: Optional[Callable[[], None]] = None, verbose=False):
         """
         连接到 Arduino 上的 GRBL。
         port      : 串口设备名，例如 /dev/ttyACM0 或 /dev/ttyUSB0
         baudrate  : 波特率，GRBL 默认 115200
         timeout   : 读串口的超时时间（秒）
+        response_timeout : 等一条指令回复 ok/error 的总超时（秒）
+        idle_callback : 等回复期间每 50ms 没有数据就调用一次（例如 pygame.event.pump，防止窗口假死）
+        verbose   : True 时打印每一行 GRBL 回复（正式打印时建议关掉，逐行 print 本身就很慢）
         """
         self.ser = serial.Serial(port, baudrate=baudrate, timeout=timeout)
+        self.response_timeout = response_timeout
+        self.idle_callback = idle_callback
+        self.verbose = verbose
+
+        # 用 poll 等串口可读，不在 readline() 里空等整个 timeout
+        self._poll = select.poll()
+        self._poll.register(self.ser.fileno(), select.POLLIN)
+        self._rx_buf = bytearray()
+        # 读状态时顺带读到的其它回复（比如前面命令的 ok），留给 _read_response_line
+        self._held_lines = collections.deque()
 
         # Arduino 上电后会 reset，等它醒一会儿
         time.sleep(2)
@@ -30,6 +54,33 @@ class GrblController:
                 break
             print(f"[GRBL启动] {line}")
 
+    def _read_response_line(self, deadline: float) -> bytes:
+        """
+        读一行 GRBL 回复（bytes，已去掉首尾空白，可能是空的）。
+        GRBL 回复都是 ASCII，直接按 bytes 比较，不做解码。
+        deadline: time.monotonic() 的截止时间，超过就抛 TimeoutError。
+        """
+        if self._held_lines:
+            return self._held_lines.popleft()
+        return self._read_serial_line(deadline)
+
+    def _read_serial_line(self, deadline: float) -> bytes:
+        """从串口读一行（不看 _held_lines），超过 deadline 抛 TimeoutError。"""
+        while b"\n" not in self._rx_buf:
+            if time.monotonic() > deadline:
+                raise TimeoutError("等待 GRBL 回复超时")
+            if self._poll.poll(50):
+                self._rx_buf += self.ser.read(self.ser.in_waiting or 1)
+            elif self.idle_callback is not None:
+                self.idle_callback()
+        line, _, rest = self._rx_buf.partition(b"\n")
+        self._rx_buf = bytearray(rest)
+        return bytes(line).strip()
+
+    def _log_resp(self, resp: bytes) -> None:
+        if self.verbose:
+            print(f"[GRBL] {resp.decode('ascii', errors='ignore')}")
+
     def send_line(self, line: str) -> str:
         """
         发送一行 G 代码到 GRBL，并等待返回 "ok" 或 "error:...".
@@ -45,15 +96,18 @@ class GrblController:
         self.ser.flush()
 
         # 等待 GRBL 回复
+        deadline = time.monotonic() + self.response_timeout
         while True:
-            resp = self.ser.readline().decode("ascii", errors="ignore").strip()
+            resp = self._read_response_line(deadline)
             if not resp:
                 continue  # 读到空行就继续等
-            print(f"[GRBL] {resp}")
+            self._log_resp(resp)
 
             # 通常 GRBL 每条指令最后会给一个 ok 或 error
-            if resp.startswith("ok") or resp.startswith("error"):
-                return resp
+            if resp == b"ok":
+                return "ok"
+            if resp.startswith(b"ok") or resp.startswith(b"error"):
+                return resp.decode("ascii", errors="ignore")
 
     def send_gcode_block(self, lines):
         """
@@ -62,6 +116,78 @@ class GrblController:
         for line in lines:
             self.send_line(line)
 
+    def send_gcode_stream(self, lines):
+        """
+        用“字符计数”协议流式发送多行 G 代码：
+        只要已发出、还没回 ok 的字节数不超过 GRBL 接收缓冲，就继续发下一行，
+        不用每行都等 ok。遇到 error 立即停止并抛 RuntimeError。
+        需要逐行确认的初始化命令请继续用 send_gcode_block。
+        """
+        pending = collections.deque()  # 已发出、等待 ok 的每行字节数
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            payload = (line + "\n").encode("ascii")
+
+            # 缓冲放不下这一行：先等一条回复，腾出空间
+            while pending and sum(pending) + len(payload) > RX_BUFFER_SIZE:
+                self._wait_stream_ack(pending)
+
+            self.ser.write(payload)
+            pending.append(len(payload))
+
+        # 收齐剩下所有行的回复
+        while pending:
+            self._wait_stream_ack(pending)
+
+    def _wait_stream_ack(self, pending):
+        """读到一条 ok 就把最早的一行从 pending 里去掉；error 则抛异常。"""
+        deadline = time.monotonic() + self.response_timeout
+        while True:
+            resp = self._read_response_line(deadline)
+            if not resp:
+                continue
+            self._log_resp(resp)
+            if resp.startswith(b"ok"):
+                pending.popleft()
+                return
+            if resp.startswith(b"error"):
+                raise RuntimeError(f"GRBL 返回错误：{resp.decode('ascii', errors='ignore')}")
+
+    def _read_status_line(self, deadline: float) -> str:
+        """
+        只等 '<...>' 状态行；中间读到的其它行（前面命令的 ok/error）先存起来，
+        之后 send_line / send_gcode_stream 还能正常读到，不会被这里吃掉。
+        """
+        while True:
+            line = self._read_serial_line(deadline)
+            if line.startswith(b"<") and line.endswith(b">"):
+                return line.decode("ascii", errors="ignore")
+            if line:
+                self._held_lines.append(line)
+
+    def wait_idle(self, timeout_s=180.0):
+        """
+        发实时命令 '?'（不带换行，GRBL 不会回 ok）查询状态，直到 <Idle|...>。
+        轮询间隔按 STATUS_BACKOFF_S 逐渐变长。返回最后的状态行。
+        """
+        deadline = time.monotonic() + timeout_s
+        polls = 0
+        while True:
+            self.ser.write(b"?")
+            status = self._read_status_line(deadline)
+            # <Idle|MPos:...|FS:0,0>；Hold:0 / Door:1 这类带子状态
+            state = status[1:].split("|", 1)[0].split(":", 1)[0]
+            if state == "Idle":
+                return status
+            if state == "Alarm":
+                raise RuntimeError(f"GRBL 处于 ALARM：{status}")
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"等待 GRBL Idle 超时。最后状态：{status}")
+            time.sleep(STATUS_BACKOFF_S[min(polls, len(STATUS_BACKOFF_S) - 1)])
+            polls += 1
+
     def close(self):
         """关闭串口连接。"""
         self.ser.close()
@@ -3,7 +3,7 @@ from grbl_c import GrblController
 
 def main():
     # 这里的端口换成你实际查到的，比如 "/dev/ttyUSB0"
-    grbl = GrblController(port="/dev/ttyUSB0", baudrate=115200)
+    grbl = GrblController(port="/dev/ttyUSB0", baudrate=115200, verbose=True)
 
     # 典型初始化：用 mm 单位，绝对坐标
     grbl.send_line("G21")  # mm
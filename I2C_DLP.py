@@ -8,17 +8,19 @@ DLP4710 + DLPC3439：树莓派 I2C 控制（内部测试图 TPG + 仅蓝光）
 """
 
 import time
-from smbus import SMBus
+from smbus2 import SMBus
 
-# ========= 你的硬件参数（可改） =========
-I2C_BUS = 1
-I2C_ADDR = 0x1B  # 常见：文档默认 36h(8-bit写) => 7-bit = 0x36>>1 = 0x1B  :contentReference[oaicite:3]{index=3}
+import dlp_i2c
+
+# ========= 你的硬件参数（可改：dlp_i2c.py） =========
+I2C_BUS = dlp_i2c.I2C_BUS_NUM
+I2C_ADDR = dlp_i2c.DLP_I2C_ADDR  # 常见：文档默认 36h(8-bit写) => 7-bit = 0x36>>1 = 0x1B  :contentReference[oaicite:3]{index=3}
 
 # 蓝灯默认“电流码值”（10-bit，0~1023）。注意：这是“码值”，不是直接 mA。
 DEFAULT_BLUE_CODE = 300
 
 
-# ========= 底层 I2C 发送模块 =========
+# ========= 底层 I2C 发送模块（实际发送在 dlp_i2c.py） =========
 def write_cmd(bus: SMBus, cmd: int, data=()):
     """
     发送一条 DLPC3439 I2C 写命令：
@@ -26,8 +28,42 @@ def write_cmd(bus: SMBus, cmd: int, data=()):
       - data：参数字节数组（0..N）
     对应文档 I2C 写事务：Address + Sub-Address + Remaining Data Bytes  :contentReference[oaicite:4]{index=4}
     """
-    bus.write_i2c_block_data(I2C_ADDR, cmd, list(data))
-    time.sleep(0.002)  # 给芯片一点处理时间（简单做法）
+    write_cmd_nodelay(bus, cmd, data)
+    flush()  # 给芯片留一点处理时间（下一条命令前补足）
+
+
+def write_cmd_nodelay(bus: SMBus, cmd: int, data=()):
+    """
+    和 write_cmd 一样发送一条命令，但发完不等待。
+    连续发多条命令时用它，最后统一调用一次 flush()。
+    用 i2c_rdwr 直接发原始 I2C 写（Address + Sub-Address + Data），不走 SMBus 块写协议。
+    """
+    dlp_i2c.write_cmd_nodelay(cmd, data, bus=bus)
+
+
+def write_cmd_batch(bus: SMBus, ops):
+    """
+    一次 ioctl 发送多条命令，发完统一等待一次：
+      - ops：[(cmd, data), ...]
+    每条命令还是一个独立的 I2C 写消息，只是合并成一次内核调用。
+    """
+    dlp_i2c.write_cmd_batch(ops, bus=bus)
+
+
+def flush(delay: float = 0.002):
+    """一组命令发完后，给芯片留的处理时间（下一条命令发送前补足）。"""
+    dlp_i2c.flush(delay)
+
+
+# 配置没变的命令（输入源 / LED 模式 / 测试图 / 电流……）直接省掉，不再重发
+_changed = dlp_i2c.changed
+
+
+def _write_if_changed(bus: SMBus, ops, force: bool = False):
+    """只发送参数有变化的命令（force=True 则全部发送）。"""
+    ops = [(cmd, data) for cmd, data in ops if force or _changed(cmd, data)]
+    if ops:
+        write_cmd_batch(bus, ops)
 
 
 def pack_10bit_le(code: int):
@@ -35,15 +71,21 @@ def pack_10bit_le(code: int):
     把 10-bit 码值（0..1023）拆成：LSByte + MSByte（小端）
     - 0x54（LED电流）里每个颜色用 2 字节，但有效只有 10 bit  :contentReference[oaicite:5]{index=5}
     - 高位未用必须写 0（只保留 MSByte 的低 2 bit） :contentReference[oaicite:6]{index=6}
+    直接查 _PACK10_LUT，不做位运算。
     """
-    code = int(code)
-    if code < 0:
-        code = 0
-    if code > 1023:
-        code = 1023
-    lsb = code & 0xFF
-    msb = (code >> 8) & 0x03
-    return lsb, msb
+    return _PACK10_LUT[_clamp_10bit(code)]
+
+
+def _clamp_10bit(code) -> int:
+    """限幅到 0..1023 并取整。"""
+    return 0 if code < 0 else 1023 if code > 1023 else int(code)
+
+
+# 10-bit 码值 -> (LSByte, MSByte)，导入时算好
+_PACK10_LUT = [((c & 0xFF), (c >> 8) & 0x03) for c in range(1024)]
+
+# 最常用的“红绿为 0、只有蓝”的 0x54 六字节参数，也提前算好
+_BLUE_ONLY_PAYLOAD = [bytes([0, 0, 0, 0, lsb, msb]) for lsb, msb in _PACK10_LUT]
 
 
 # ========= 功能模块：输入源 / 测试图 =========
@@ -73,11 +115,17 @@ def set_test_pattern(bus: SMBus, pattern: int, fg_color: int, bg_color: int = 0,
       07h Checkerboard（棋盘格）
       08h Color bars（色条）
     """
+    write_cmd(bus, 0x0B, _test_pattern_params(pattern, fg_color, bg_color, border, p1, p2, p3, p4))
+
+
+def _test_pattern_params(pattern: int, fg_color: int, bg_color: int = 0, border: bool = False,
+                         p1: int = 0, p2: int = 0, p3: int = 0, p4: int = 0):
+    """0x0B 的参数字节（见 set_test_pattern）。"""
     b1 = (0x80 if border else 0x00) | (pattern & 0x0F)
     b2 = ((fg_color & 0x07) << 4) | (bg_color & 0x07)
 
     # 这里统一发 6 字节（Byte3~6 有些图案不用也没关系，I2C 支持可变长度 0→N :contentReference[oaicite:12]{index=12}）
-    write_cmd(bus, 0x0B, [b1, b2, p1 & 0xFF, p2 & 0xFF, p3 & 0xFF, p4 & 0xFF])
+    return [b1, b2, p1 & 0xFF, p2 & 0xFF, p3 & 0xFF, p4 & 0xFF]
 
 
 def image_freeze(bus: SMBus, enable: bool):
@@ -97,8 +145,13 @@ def set_curtain(bus: SMBus, enable: bool, color: int = 0):
       bit0 = enable（1启用，0关闭）
     注意：Curtain 只是画面层面“变黑”，不等于关 LED。
     """
+    write_cmd(bus, 0x16, _curtain_params(enable, color))
+
+
+def _curtain_params(enable: bool, color: int = 0):
+    """0x16 的参数字节（见 set_curtain）。"""
     param = ((color & 0x07) << 1) | (0x01 if enable else 0x00)
-    write_cmd(bus, 0x16, [param])
+    return [param]
 
 
 # ========= 功能模块：LED（只开蓝） =========
@@ -129,10 +182,17 @@ def set_led_current_rgb(bus: SMBus, r_code: int, g_code: int, b_code: int):
       Byte5-6：Blue (LSByte, MSByte)
     并且码值是 10-bit 分辨率（0~1023） :contentReference[oaicite:18]{index=18}
     """
+    write_cmd(bus, 0x54, _led_current_params(r_code, g_code, b_code))
+
+
+def _led_current_params(r_code: int, g_code: int, b_code: int):
+    """0x54 的参数字节（见 set_led_current_rgb）。"""
+    if r_code <= 0 and g_code <= 0:
+        return _BLUE_ONLY_PAYLOAD[_clamp_10bit(b_code)]
     r_lsb, r_msb = pack_10bit_le(r_code)
     g_lsb, g_msb = pack_10bit_le(g_code)
     b_lsb, b_msb = pack_10bit_le(b_code)
-    write_cmd(bus, 0x54, [r_lsb, r_msb, g_lsb, g_msb, b_lsb, b_msb])
+    return [r_lsb, r_msb, g_lsb, g_msb, b_lsb, b_msb]
 
 
 # ========= “开机/关光”组合动作 =========
@@ -144,30 +204,63 @@ def wait_auto_init():
     time.sleep(0.6)
 
 
-def projector_on_tpg_blue(bus: SMBus, blue_code: int, pattern: int):
+# 0x05 选择 Test Pattern Generator Mode = 01h :contentReference[oaicite:23]{index=23}
+_INPUT_TPG = (0x05, [0x01])
+# 0x50 = 00 LED 手动模式 :contentReference[oaicite:24]{index=24}
+_LED_MANUAL = (0x50, [0x00])
+# 0x52 bit2=1 只开蓝 :contentReference[oaicite:26]{index=26}
+_LED_BLUE_ON = (0x52, [0x04])
+
+
+def _pattern_op(pattern: int):
+    """0x0B 测试图：前景蓝（3），背景黑（0） :contentReference[oaicite:22]{index=22}"""
+    return (0x0B, _test_pattern_params(pattern, fg_color=3, bg_color=0, border=False))
+
+
+def _blue_op(blue_code: int):
+    """0x54 只设蓝电流（10bit） :contentReference[oaicite:25]{index=25}"""
+    return (0x54, _led_current_params(0, 0, blue_code))
+
+
+def set_blue(bus: SMBus, blue_code: int, force: bool = False):
+    """只改蓝灯电流；和当前一样就什么都不发。"""
+    _write_if_changed(bus, [_blue_op(blue_code)], force)
+
+
+def projector_on_tpg_blue(bus: SMBus, blue_code: int, pattern: int, force: bool = False):
     """
     用内部测试图点亮（TPG）+ 仅蓝光：
     推荐顺序：
       Freeze -> 黑幕 -> 配测试图(0x0B) -> 选输入源TPG(0x05=01)
              -> LED手动(0x50) -> 设电流(0x54) -> 使能蓝灯(0x52)
              -> 关黑幕 -> Unfreeze
+    整串命令用 write_cmd_batch 一次发出，最后统一等待一次。
+    芯片里已经是这个配置的命令会被省掉：只有测试图/输入源变了才做 Freeze + 黑幕；
+    force=True 时整串全部重发。
     """
-    image_freeze(bus, True)  # 0x1A freeze :contentReference[oaicite:20]{index=20}
-    set_curtain(bus, True, color=0)  # 0x16 黑幕 :contentReference[oaicite:21]{index=21}
+    pattern_op = _pattern_op(pattern)
+    reconfig = force or _changed(*pattern_op) or _changed(*_INPUT_TPG)
 
-    # 0x0B 测试图：前景蓝（3），背景黑（0） :contentReference[oaicite:22]{index=22}
-    set_test_pattern(bus, pattern=pattern, fg_color=3, bg_color=0, border=False)
-
-    # 0x05 选择 Test Pattern Generator Mode = 01h :contentReference[oaicite:23]{index=23}
-    set_input_source(bus, 0x01)
+    ops = []
+    if reconfig:
+        ops.append((0x1A, [0x01]))                    # 0x1A freeze :contentReference[oaicite:20]{index=20}
+        ops.append((0x16, _curtain_params(True, 0)))  # 0x16 黑幕 :contentReference[oaicite:21]{index=21}
+        ops.append(pattern_op)
+        ops.append(_INPUT_TPG)
 
     # LED：手动模式 + 蓝电流 + 只开蓝
-    set_led_control_manual(bus)                   # 0x50 = 00 :contentReference[oaicite:24]{index=24}
-    set_led_current_rgb(bus, 0, 0, blue_code)     # 0x54 10bit :contentReference[oaicite:25]{index=25}
-    set_led_enable_blue_only(bus, True)           # 0x52 bit2=1 :contentReference[oaicite:26]{index=26}
+    for op in (_LED_MANUAL, _blue_op(blue_code), _LED_BLUE_ON):
+        if force or _changed(*op):
+            ops.append(op)
+
+    curtain_off = (0x16, _curtain_params(False, 0))
+    if reconfig or _changed(*curtain_off):
+        ops.append(curtain_off)                       # 0x16 关黑幕
+    if reconfig:
+        ops.append((0x1A, [0x00]))                    # 0x1A unfreeze
 
-    set_curtain(bus, False, color=0)  # 0x16 关黑幕
-    image_freeze(bus, False)          # 0x1A unfreeze
+    if ops:
+        write_cmd_batch(bus, ops)
 
 
 def projector_off(bus: SMBus):
@@ -177,11 +270,13 @@ def projector_off(bus: SMBus):
       - 可选：0x16 打开黑幕防止残影/闪一下 :contentReference[oaicite:28]{index=28}
     注意：这不是“断电关机”，只是 I2C 层面把光源关掉。
     """
-    image_freeze(bus, True)
-    set_led_enable_blue_only(bus, False)     # 0x52 -> 0x00
-    set_led_current_rgb(bus, 0, 0, 0)        # 0x54 -> 全0（可选但建议）
-    set_curtain(bus, True, color=0)          # 黑幕
-    image_freeze(bus, False)
+    write_cmd_batch(bus, [
+        (0x1A, [0x01]),
+        (0x52, [0x00]),                      # 0x52 -> 0x00
+        (0x54, _led_current_params(0, 0, 0)),  # 0x54 -> 全0（可选但建议）
+        (0x16, _curtain_params(True, 0)),    # 黑幕
+        (0x1A, [0x00]),
+    ])
 
 
 # ========= 主程序：交互菜单 =========
@@ -190,7 +285,7 @@ def main():
     print(f"I2C bus={I2C_BUS}, addr=0x{I2C_ADDR:02X}")
     print("上电后先等待 0.6s（auto-init 完成后才收命令）")
 
-    bus = SMBus(I2C_BUS)
+    bus = dlp_i2c.get_bus()
     blue_code = DEFAULT_BLUE_CODE
 
     try:
@@ -230,7 +325,7 @@ def main():
                         raise ValueError
                     blue_code = v
                     # 如果正在亮灯，你也可以实时刷新电流：
-                    set_led_current_rgb(bus, 0, 0, blue_code)  # 0x54
+                    set_blue(bus, blue_code)  # 0x54
                     print(f"已设置 blue_code={blue_code}")
                 except ValueError:
                     print("输入无效，请输入 0~1023 的整数")
@@ -248,10 +343,7 @@ def main():
                 print("未知指令")
 
     finally:
-        try:
-            bus.close()
-        except Exception:
-            pass
+        dlp_i2c.close_bus()
 
 
 if __name__ == "__main__":
@@ -2,7 +2,7 @@
 # -*- coding: utf-8 -*-
 
 """
-树莓派 + Python + SMBus 通过 I2C 控制 DLPC3439 (DLP4710)：
+树莓派 + Python + smbus2 通过 I2C 控制 DLPC3439 (DLP4710)：
 
 功能：
 1. 初始化光机（外部视频源 + 只用蓝光 + 关幕布）
@@ -17,24 +17,22 @@
 """
 
 import time
-import smbus  # sudo apt-get install python3-smbus
+
+import dlp_i2c  # 底层发送 + 共享总线（第一次发命令时才打开 /dev/i2c-1）
 
 # ------------------------------
-# 1. 全局配置：I2C 地址与总线编号
+# 1. 全局配置：I2C 地址与总线编号（在 dlp_i2c.py 里改）
 # ------------------------------
 
 # DLPC3439 的 7-bit I2C 地址（Arduino 里 0x36 >> 1 = 0x1B）
-DLP_I2C_ADDR = 0x1B
+DLP_I2C_ADDR = dlp_i2c.DLP_I2C_ADDR
 
 # 树莓派上 I2C 总线，一般是 /dev/i2c-1
-I2C_BUS_NUM = 1
+I2C_BUS_NUM = dlp_i2c.I2C_BUS_NUM
 
 # 默认蓝光电流参数（10bit，示例取 0x0200，对应中等亮度）
 DEFAULT_BLUE_CURRENT = 0x0200
 
-# 创建 SMBus 对象
-bus = smbus.SMBus(I2C_BUS_NUM)
-
 
 # ------------------------------
 # 2. 工具函数：高/低字节
@@ -54,6 +52,32 @@ def high_byte(x: int) -> int:
 # 3. 通用 I2C 写命令
 # ------------------------------
 
+def dlp_write_cmd_nodelay(cmd: int, data_bytes):
+    """
+    向 DLPC3439 发送一条 I2C 命令，但不做命令后的等待。
+
+    连续发多条命令时用它，最后统一调用一次 dlp_flush()。
+    """
+    dlp_i2c.write_cmd_nodelay(cmd, data_bytes)
+
+
+def dlp_write_cmd_batch(ops):
+    """
+    一次 ioctl 发送多条命令，发完统一等待一次。
+
+    ops: [(cmd, data_bytes), ...]
+    """
+    dlp_i2c.write_cmd_batch(ops)
+
+
+def dlp_flush(delay: float = 0.002):
+    """
+    一组命令发完后，给芯片留一点处理时间（对应 Arduino 里的 delay(2)）。
+    这里只记下截止时刻，等待放到下一条命令发送前。
+    """
+    dlp_i2c.flush(delay)
+
+
 def dlp_write_cmd(cmd: int, data_bytes):
     """
     向 DLPC3439 发送一条 I2C 命令。
@@ -61,14 +85,8 @@ def dlp_write_cmd(cmd: int, data_bytes):
     cmd:       命令码 / OpCode，例如 0x50, 0x52, 0x54 等
     data_bytes: 要写入的参数字节 list/tuple
     """
-    if data_bytes is None:
-        data_bytes = []
-
-    data_list = [int(b) & 0xFF for b in data_bytes]
-    bus.write_i2c_block_data(DLP_I2C_ADDR, cmd, data_list)
-
-    # 对应 Arduino 里的 delay(2)
-    time.sleep(0.002)
+    dlp_write_cmd_nodelay(cmd, data_bytes)
+    dlp_flush()
 
 
 # ------------------------------
@@ -145,11 +163,19 @@ def dlp_set_blue_brightness_percent(percent: float):
     if percent > 100:
         percent = 100
 
-    max_param = 0x03FF  # 10bit 最大值
-    raw = int(max_param * (percent / 100.0))
+    # 整数百分比直接查表；带小数的才现算
+    if percent == int(percent):
+        raw = _PCT_TO_RAW[int(percent)]
+    else:
+        raw = int(_MAX_PARAM * (percent / 100.0))
     dlp_set_blue_current(raw)
 
 
+# 0~100% -> 10bit 电流参数，导入时算好
+_MAX_PARAM = 0x03FF  # 10bit 最大值
+_PCT_TO_RAW = [int(_MAX_PARAM * (p / 100.0)) for p in range(101)]
+
+
 # ------------------------------
 # 5. 只使用蓝光的初始化流程
 # ------------------------------
@@ -188,27 +214,23 @@ def dlp_setup_external_video_1920x1080_RGB888():
     width = 1920
     height = 1080
 
-    # 1) 输入图像大小 (0x2E)
+    # 输入图像大小和显示尺寸是同一组 4 字节参数，只算一次
     params_size = [
         low_byte(width),  high_byte(width),
         low_byte(height), high_byte(height),
     ]
-    dlp_write_cmd(0x2E, params_size)
+    params_disp = params_size
 
-    # 2) 外部视频格式 (0x07)
     fmt = 0x43  # Parallel, 24-bit RGB888, 1 clk/pixel
-    dlp_write_cmd(0x07, [fmt])
-
-    # 3) 显示尺寸 (0x12)
-    params_disp = [
-        low_byte(width),  high_byte(width),
-        low_byte(height), high_byte(height),
-    ]
-    dlp_write_cmd(0x12, params_disp)
-
-    # 4) 选择输入源为 External Video Mode (0x05)
     src = 0x00  # 00h = External Video Mode
-    dlp_write_cmd(0x05, [src])
+
+    # 四条命令一次 ioctl 发出，最后统一等待一次
+    dlp_write_cmd_batch([
+        (0x2E, params_size),   # 1) 输入图像大小
+        (0x07, [fmt]),         # 2) 外部视频格式
+        (0x12, params_disp),   # 3) 显示尺寸
+        (0x05, [src]),         # 4) 选择输入源为 External Video Mode
+    ])
 
 
 # ------------------------------
@@ -2,25 +2,29 @@
 """树莓派打印参数配置（你主要改这个文件）。
 
 这套 runner 约定：
-- gcode 逐行读取，先去掉 ';' 之后的注释
+- 开始前整个 gcode 解析一遍（结果缓存在 <gcode>.plan.pkl），先去掉 ';' 之后的注释
 - M6054: 只用于“选择当前层图片”（不发给 GRBL）
-- M106 S255: 显示当前图片 + 打开光机蓝灯（不发给 GRBL）
+- M106 S255: 等前面的运动走完（G4 P0 同步）-> 显示当前图片 + 打开光机蓝灯（不发给 GRBL）
 - M106 S0: 黑屏 + 关闭光机 LED（不发给 GRBL）
 - G4 Pxxxx: 树莓派 sleep（不发给 GRBL）
-- 其它 G/\$/etc: 发给 GRBL，逐行等待 ok/error
+- 其它 G/\$/etc: 发给 GRBL，连续的多行按字符计数协议流式发送（不逐行等 ok），
+  在下一个树莓派侧的 G4 / M106 S255 之前和文件结束时收齐所有 ok/error
 """
 
-from dataclasses import dataclass
-from typing import Optional
+import os
+from dataclasses import dataclass, field
+from typing import ClassVar, Optional
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Settings:
     # ========= 路径 =========
+    # 项目根目录：换机器/换目录时只改这一行
+    BASE: ClassVar[str] = "/home/ikastra/Desktop/FurDLP_gpt_zh"
     # 图片文件夹：里面放 1.png / 2.png / ... 或你 slicer 输出的名字
-    IMAGE_DIR: str = "/home/ikastra/Desktop/FurDLP_gpt_zh/shuangqu"
+    IMAGE_DIR: str = field(default_factory=lambda: os.path.join(Settings.BASE, "shuangqu"))
     # slicer 生成的 gcode 路径
-    GCODE_FILE: str = "/home/ikastra/Desktop/FurDLP_gpt_zh/shuangqu/run.gcode"
+    GCODE_FILE: str = field(default_factory=lambda: os.path.join(Settings.BASE, "shuangqu", "run.gcode"))
 
     # ========= 串口/GRBL =========
     SERIAL_PORT: str = "/dev/ttyUSB0"   # 常见：/dev/ttyACM0 或 /dev/ttyUSB0
@@ -33,15 +37,15 @@ class Settings:
     # 是否发送 $H 回零（需要你在 GRBL 开启 homing）
     HOME_BEFORE_PRINT: bool = False
 
-    # “曝光前等待到位”的超时时间
+    # “曝光前等待到位”（G4 P0 同步）的超时时间
     GRBL_IDLE_TIMEOUT_S: float = 180.0
-    # 轮询状态间隔
-    GRBL_STATUS_POLL_S: float = 0.10
 
     # ========= HDMI 显示 =========
     # exposure.init_display(display_index=?) 的参数
     # 0/1 取决于你 HDMI 投影屏是系统里的第几个 display
     DISPLAY_INDEX: int = 1
+    # SDL 视频驱动：树莓派不开桌面直接出 HDMI 时可设为 "kmsdrm"；None 用 SDL 默认
+    SDL_VIDEO_DRIVER: Optional[str] = None
 
     # ========= 光机 I2C =========
     # 如果你只想先调运动/显示，不想碰 I2C，设为 False
@@ -52,10 +56,15 @@ class Settings:
     # ========= 安全/调试 =========
     # True：只打印日志，不动电机、不点灯（强烈建议第一次先 True 跑一遍）
     DRY_RUN: bool = False
+    # 日志级别："INFO" 只打印每层的曝光/等待；"DEBUG" 还打印每一行 gcode 的处理（DRY_RUN 时固定 DEBUG）
+    LOG_LEVEL: str = "INFO"
 
     # 在长时间 G4 dwell 时，pygame 事件泵频率（避免窗口假死）
     EVENT_PUMP_HZ: int = 30
     # 曝光后等待时间
     POST_EXPOSURE_BLACK_DELAY_S: float = 1
+    # True：曝光后黑屏等待期间就开始下一层的 GRBL 运动（剩余时间在下一次曝光前补足），
+    # 每层省下 min(运动时间, 等待时间)；如果这段等待是为了让树脂/模型静置再抬升，保持 False
+    OVERLAP_POST_EXPOSURE_MOVES: bool = False
     # 每层开始曝光（M106 S255）前，黑屏额外等待的时间（秒）
     PRE_EXPOSURE_BLACK_DELAY_S: float = 3
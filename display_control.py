@@ -9,7 +9,7 @@ exposure.py 已经提供：
 
 本文件做的事：
 1) 自动把“项目根目录”加入 sys.path，确保能 import exposure
-2) 提供一个更“面向 runner”的接口：show(image), black(), sleep_with_pump()
+2) 提供一个更“面向 runner”的接口：show(image), black(), pump_for() / sleep_only()
 """
 
 from __future__ import annotations
@@ -19,6 +19,8 @@ import sys
 import time
 from typing import Optional
 
+import pygame
+
 # 让本文件能 import 到上一级的 exposure.py
 _PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 if _PROJECT_ROOT not in sys.path:
@@ -26,46 +28,94 @@ if _PROJECT_ROOT not in sys.path:
 
 import exposure  # noqa: E402  (来自你的项目)
 
+# HdmiDisplay._content 表示“黑屏”的值（不会和图片路径重复）
+_BLACK = ""
+
 
 class HdmiDisplay:
-    def __init__(self, display_index: int = 1, event_pump_hz: int = 30):
+    def __init__(self, display_index: int = 1, event_pump_hz: int = 30, video_driver: Optional[str] = None):
         self.display_index = display_index
+        self.video_driver = video_driver
         self.event_pump_hz = max(1, int(event_pump_hz))
         self._inited = False
+        # 屏幕上现在是什么：图片路径 / _BLACK / None（不知道）；和要求相同就不再重画
+        self._content: Optional[str] = None
 
     def init(self) -> None:
         if self._inited:
             return
-        exposure.init_display(self.display_index)
+        exposure.init_display(self.display_index, video_driver=self.video_driver)
         self._inited = True
 
     def show(self, image_path: str) -> None:
         """显示图片（保持显示，不自动计时）。"""
         self.init()
-        exposure.start_exposure(image_path)
+        if self._content == image_path:
+            return
+        # 加载失败时屏幕没变，不记下来，下次同一张图还会重试
+        if exposure.start_exposure(image_path):
+            self._content = image_path
+
+    def preload(self, image_path: str) -> None:
+        """
+        提前解码一张图片进 exposure 的缓存，之后 show() 只剩 blit。可以在后台线程调用；
+        还没 init（显示窗口只能在主线程创建）时什么都不做。
+        缓存只留最近 3 张（exposure._SURFACE_CACHE_MAX），正好容纳当前层和预解码的下一层。
+        """
+        if self._inited:
+            exposure.preload_image(image_path)
 
     def black(self) -> None:
         """显示黑屏。"""
         if not self._inited:
             # 没初始化时也没必要黑屏
             return
+        if self._content == _BLACK:
+            return
         exposure.stop_exposure()
+        self._content = _BLACK
 
     def close(self) -> None:
         if self._inited:
             exposure.close_display()
         self._inited = False
+        self._content = None
 
-    def sleep_with_pump(self, seconds: float) -> None:
-        """等待期间持续处理 pygame 事件，防止窗口卡死。"""
+    def pump_events(self) -> None:
+        """处理一次 pygame 内部事件（还没 init 时什么都不做）。可以当作等待回调传给 GrblClient。"""
+        if self._inited:
+            pygame.event.pump()
+
+    def sleep_only(self, seconds: float) -> None:
+        """
+        单纯 sleep，不处理 pygame 事件。用在黑屏+关灯的等待里：屏幕上没东西要刷新，
+        CPU 留给后台预解码；积压的事件下一次 pump/show 时再处理。
+        """
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def pump_for(self, seconds: float) -> None:
+        """等待期间按 event_pump_hz 处理 pygame 事件，防止窗口卡死。"""
         if seconds <= 0:
             return
         period = 1.0 / self.event_pump_hz
-        t_end = time.time() + seconds
+        # 太短的等待不值得 pump，直接 sleep
+        if not self._inited or seconds < period * 2:
+            time.sleep(seconds)
+            return
+
+        t_end = time.monotonic() + seconds
+        # 用 SDL 自己的定时等待，每个周期只 pump 一次；每次都按截止时刻算剩余时间，
+        # SDL_Delay/pump 的超时不会累加到等待（曝光）时间上
+        wait_ms = int(1000 * period)
         while True:
-            now = time.time()
-            if now >= t_end:
+            pygame.event.pump()
+            remaining = t_end - time.monotonic()
+            if remaining <= 0:
+                return
+            remaining_ms = int(remaining * 1000)
+            if remaining_ms < wait_ms:
+                # 最后不到一个周期：精确 sleep 到截止时刻
+                time.sleep(remaining)
                 return
-            # exposure.py 内部会在 _process_events 里 pump 事件；
-            # 但我们这里不直接调用私有函数，简单 show/black 时 pygame 已经在跑。
-            time.sleep(min(period, t_end - now))
+            pygame.time.wait(wait_ms)
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""DLPC3439 I2C 底层发送（I2C_DLP.py 和 I2C_DLP_HDMI.py 共用）。
+
+- I2C 写事务格式：Address(36h) + Sub-Address(命令码) + 参数(0..N字节)
+- 整个进程只打开一次 /dev/i2c-N，而且第一次真正发命令时才打开（import 时不碰硬件）
+- 命令之间的 2ms 处理时间按截止时刻补足，不在每条命令后固定 sleep
+- 记录每个命令码最近写入的参数，上层可以跳过没有变化的命令
+"""
+
+from __future__ import annotations
+
+import functools
+import time
+
+from smbus2 import SMBus, i2c_msg  # pip3 install smbus2
+
+# DLPC3439 的 7-bit I2C 地址（文档默认 36h(8-bit写) => 7-bit = 0x36>>1 = 0x1B）
+DLP_I2C_ADDR = 0x1B
+
+# 树莓派上 I2C 总线，一般是 /dev/i2c-1
+I2C_BUS_NUM = 1
+
+# 下一条命令最早可以发送的时刻（time.monotonic()）。
+_next_ok_t = 0.0
+
+# 每个命令码最近一次写进芯片的参数（bytes）。
+_state = {}
+
+
+@functools.lru_cache(maxsize=1)
+def get_bus() -> SMBus:
+    """第一次调用时打开 I2C 总线，之后一直复用同一个对象。"""
+    return SMBus(I2C_BUS_NUM)
+
+
+def close_bus() -> None:
+    """关闭共享的 I2C 总线（没打开过就什么都不做）。"""
+    if get_bus.cache_info().currsize:
+        try:
+            get_bus().close()
+        except Exception:
+            pass
+        get_bus.cache_clear()
+
+
+def _msg(cmd: int, data) -> i2c_msg:
+    """构造一条原始 I2C 写消息：Address + Sub-Address(cmd) + 参数字节。"""
+    if data is None:
+        data = []
+    payload = bytes([cmd & 0xFF]) + bytes(int(b) & 0xFF for b in data)
+    return i2c_msg.write(DLP_I2C_ADDR, payload)
+
+
+def write_cmd_nodelay(cmd: int, data=(), bus: SMBus | None = None) -> None:
+    """发送一条命令，发完不等待（下一组命令前再补足处理时间）。"""
+    write_cmd_batch([(cmd, data)], bus=bus, settle=False)
+
+
+def write_cmd_batch(ops, bus: SMBus | None = None, settle: bool = True) -> None:
+    """
+    一次 ioctl 发送多条命令：
+      - ops：[(cmd, data), ...]
+      - bus：不传就用 get_bus() 的共享总线
+      - settle：发完是否记一次 2ms 处理时间（见 flush）
+    每条命令还是一个独立的 I2C 写消息，只是合并成一次内核调用。
+    """
+    msgs = [_msg(cmd, data) for cmd, data in ops]
+    if msgs:
+        _wait_ready()
+        (bus or get_bus()).i2c_rdwr(*msgs)
+        for cmd, data in ops:
+            _state[cmd] = bytes(int(b) & 0xFF for b in (data or ()))
+    if settle:
+        flush()
+
+
+def flush(delay: float = 0.002) -> None:
+    """
+    一组命令发完后，给芯片留的处理时间。
+    这里只记下截止时刻，真正的等待放到下一条命令发送前（见 _wait_ready）。
+    """
+    global _next_ok_t
+    _next_ok_t = time.monotonic() + delay
+
+
+def _wait_ready() -> None:
+    """如果离上一组命令还不到 flush() 要求的时间，就只 sleep 剩下的部分。"""
+    now = time.monotonic()
+    if now < _next_ok_t:
+        time.sleep(_next_ok_t - now)
+
+
+def changed(cmd: int, data) -> bool:
+    """这条命令的参数和芯片里现在的不一样（或者还没写过）。"""
+    return _state.get(cmd) != bytes(int(b) & 0xFF for b in (data or ()))
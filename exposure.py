@@ -1,6 +1,9 @@
+import mmap
 import os
 import sys
+import threading
 import time
+from collections import OrderedDict
 
 import pygame
 
@@ -9,28 +12,56 @@ screen = None
 screen_width = None
 screen_height = None
 clock = None
+# 预先填好的整屏黑色 Surface，stop_exposure 直接 blit
+_black_surf = None
 
+# 已经 convert + 缩放好的图片缓存（按路径），最近最少使用的先丢掉。
+# 每层只显示一次，只需要“当前层 + 预解码的下一层”；1920x1080 32bpp 一张约 8MB，
+# 放多了树莓派内存吃不消
+_SURFACE_CACHE_MAX = 3
+_surface_cache = OrderedDict()
+_surface_cache_lock = threading.Lock()
 
-def init_display(display_index=1):
+# True：图片尺寸和屏幕不一致时直接报错（请先用 tools/resize_layers.py 离线缩放好）
+# False：运行时用 smoothscale 拉伸（慢，而且会有插值误差）
+require_exact_size = True
+
+# 两色调色板图层（*.pal.bmp）的颜色：索引 0 = 黑，索引 1 = 蓝（和 I2C 只开蓝灯一致）
+LAYER_PALETTE = [(0, 0, 0), (0, 0, 255)]
+
+
+def init_display(display_index=1, video_driver=None):
     """
     初始化显示器和 pygame,全屏打开一个窗口。
     整个程序生命周期里只需要调用一次。
     :param display_index: 使用的显示器编号(0 或 1)
+    :param video_driver: 可选，SDL 视频驱动名。树莓派不开桌面时可用 "kmsdrm"，
+                         绕过 X11 合成器；None 表示用 SDL 默认
     """
-    global screen, screen_width, screen_height, clock
+    global screen, screen_width, screen_height, clock, _black_surf
 
     # 告诉 SDL/pygame，做全屏时用哪块屏幕
     os.environ["SDL_VIDEO_FULLSCREEN_DISPLAY"] = str(display_index)
+    if video_driver:
+        os.environ["SDL_VIDEODRIVER"] = video_driver
 
     pygame.init()
     pygame.mouse.set_visible(False)  # 不要鼠标指针
 
+    # 只让退出/按键事件进队列，鼠标移动等其它事件在 SDL 层直接丢掉
+    pygame.event.set_blocked(None)
+    pygame.event.set_allowed([pygame.QUIT, pygame.KEYDOWN])
+
     # 全屏窗口，分辨率就是当前这块屏的原生分辨率
-    screen = pygame.display.set_mode((0, 0), pygame.FULLSCREEN)
+    # DOUBLEBUF|HWSURFACE：支持的后端（如 KMSDRM）上 flip 是翻页而不是整屏拷贝
+    screen = pygame.display.set_mode((0, 0), pygame.FULLSCREEN | pygame.DOUBLEBUF | pygame.HWSURFACE)
 
     screen_width, screen_height = screen.get_size()
     print(f"[exposure] 当前屏幕分辨率: {screen_width} x {screen_height}")
 
+    _black_surf = pygame.Surface((screen_width, screen_height)).convert()
+    _black_surf.fill((0, 0, 0))
+
     clock = pygame.time.Clock()
 
 
@@ -39,7 +70,7 @@ def _process_events():
     内部函数：处理退出事件。
     如果检测到窗口关闭或按下 ESC,就退出程序。
     """
-    for event in pygame.event.get():
+    for event in pygame.event.get([pygame.QUIT, pygame.KEYDOWN]):
         if event.type == pygame.QUIT:
             pygame.quit()
             sys.exit(0)
@@ -51,31 +82,145 @@ def _process_events():
 
 def _load_image(path):
     """
-    内部函数：加载一张图片，并自动按屏幕大小拉伸（如果尺寸不匹配的话）。
+    内部函数：加载一张图片；尺寸不匹配时按 require_exact_size 报错或拉伸。
     返回 pygame 的 Surface 对象。
+    同一张图第二次加载直接从缓存取，不再解码/缩放。
+    """
+    with _surface_cache_lock:
+        image = _surface_cache.get(path)
+        if image is not None:
+            _surface_cache.move_to_end(path)
+            return image
+
+    image = _decode_image(path)
+    if image is None:
+        return None
+
+    with _surface_cache_lock:
+        _surface_cache[path] = image
+        _surface_cache.move_to_end(path)
+        while len(_surface_cache) > _SURFACE_CACHE_MAX:
+            _surface_cache.popitem(last=False)
+    return image
+
+
+def _decode_image(path):
+    """
+    内部函数：真正从磁盘解码一张图片 + convert + 按需拉伸（不经过缓存）。
+    tools/resize_layers.py 生成的预处理文件优先：
+      1) <图片名>.pal.bmp：8-bit 两色调色板，数据量只有 RGB 的 1/3
+      2) 同名 .raw：RGB888 原始像素，mmap 直接用，跳过 PNG 解码
+      3) 同名 .bmp：无压缩位图，加载时不用解 PNG
+    预处理文件比原图旧（原图重新切片过）时不用，免得曝光旧图层。
     """
     global screen_width, screen_height
 
+    pal_path = path + ".pal.bmp"
+    if _is_fresh(pal_path, path):
+        image = _load_palette(pal_path)
+        if image is not None:
+            return image
+
+    raw_path = path if path.lower().endswith(".raw") else os.path.splitext(path)[0] + ".raw"
+    if _is_fresh(raw_path, path):
+        image = _load_raw(raw_path)
+        if image is not None:
+            return image
+
+    # 3) 同名 .bmp（已经缩放好的无压缩位图）：走下面同一套加载/尺寸检查，只是不用解 PNG
+    load_path = path
+    bmp_path = os.path.splitext(path)[0] + ".bmp"
+    if bmp_path != path and _is_fresh(bmp_path, path):
+        load_path = bmp_path
+
     try:
-        image = pygame.image.load(path)
+        image = pygame.image.load(load_path)
     except pygame.error as e:
-        print(f"[exposure] 加载图片失败: {path}, 错误: {e}")
+        print(f"[exposure] 加载图片失败: {load_path}, 错误: {e}")
         return None
 
     image = image.convert()  # 转成和屏幕相同的像素格式，加速显示
 
     img_w, img_h = image.get_size()
     if (img_w, img_h) != (screen_width, screen_height):
+        if require_exact_size:
+            raise ValueError(
+                f"图片 {load_path} 尺寸为 {img_w}x{img_h}，屏幕为 {screen_width}x{screen_height}。"
+                f"请先用 tools/resize_layers.py 离线缩放。"
+            )
         print(f"[exposure] 警告: 图片尺寸 {img_w}x{img_h} != 屏幕 {screen_width}x{screen_height}，将进行拉伸。")
-        image = pygame.transform.scale(image, (screen_width, screen_height))
+        image = pygame.transform.smoothscale(image, (screen_width, screen_height))
 
     return image
 
 
+def _is_fresh(derived_path, src_path):
+    """内部函数：预处理文件存在，并且不比原图旧（原图不存在时只看预处理文件）。"""
+    try:
+        derived_mtime = os.path.getmtime(derived_path)
+    except OSError:
+        return False
+    try:
+        return derived_mtime >= os.path.getmtime(src_path)
+    except OSError:
+        return True
+
+
+def _load_palette(path):
+    """
+    内部函数：加载 8-bit 调色板图层，调色板强制设成 LAYER_PALETTE。
+    不做 convert()，保持 8-bit，blit 时搬运的数据更少。尺寸不符时返回 None。
+    """
+    try:
+        image = pygame.image.load(path)
+    except pygame.error as e:
+        print(f"[exposure] 加载图片失败: {path}, 错误: {e}")
+        return None
+
+    if image.get_bitsize() != 8 or image.get_size() != (screen_width, screen_height):
+        print(f"[exposure] 警告: {path} 不是 {screen_width}x{screen_height} 的 8-bit 调色板图片，忽略。")
+        return None
+
+    image.set_palette(LAYER_PALETTE)
+    return image
+
+
+def _load_raw(path):
+    """
+    内部函数：mmap 一个屏幕分辨率的 RGB888 原始像素文件（W*H*3 字节），直接生成 Surface。
+    文件大小和屏幕不符时返回 None（调用方会退回普通图片加载）。
+    """
+    length = screen_width * screen_height * 3
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        if os.fstat(fd).st_size != length:
+            print(f"[exposure] 警告: {path} 不是 {screen_width}x{screen_height} RGB888 原始数据，忽略。")
+            return None
+        with mmap.mmap(fd, length, access=mmap.ACCESS_READ) as mm:
+            raw_surf = pygame.image.frombuffer(mm, (screen_width, screen_height), "RGB")
+            # convert() 拷贝成屏幕像素格式；释放 raw_surf 后 mmap 才能关闭
+            image = raw_surf.convert()
+            del raw_surf
+    finally:
+        os.close(fd)
+    return image
+
+
+def preload_image(path):
+    """
+    同步地把一张图片解码进缓存（在调用方自己的后台线程里用），之后 start_exposure 直接 blit。
+    需要先 init_display()。
+    """
+    if screen is None:
+        raise RuntimeError("请先调用 init_display() 再 preload_image()")
+    _load_image(path)
+
+
 def start_exposure(image_path):
     """
     开始曝光：在屏幕上显示指定图片，不负责计时。
     你可以在外部用 time.sleep() 控制曝光时长。
+    返回 True 表示已经画上屏幕；图片加载失败返回 False（屏幕保持原样）。
     """
     global screen
 
@@ -86,11 +231,12 @@ def start_exposure(image_path):
 
     image = _load_image(image_path)
     if image is None:
-        return
+        return False
 
     # 画图 + 刷新
     screen.blit(image, (0, 0))
     pygame.display.flip()
+    return True
 
 
 def stop_exposure():
@@ -104,8 +250,8 @@ def stop_exposure():
 
     _process_events()
 
-    # (0, 0, 0) 是黑色
-    screen.fill((0, 0, 0))
+    # 直接贴预先准备好的黑色 Surface
+    screen.blit(_black_surf, (0, 0))
     pygame.display.flip()
 
 
@@ -1,33 +1,49 @@
 # -*- coding: utf-8 -*-
-"""GCode 执行器：逐行读取并分发到 GRBL / HDMI / I2C。
+"""GCode 执行器：先把整个文件解析成操作列表（带缓存），再按顺序分发到 GRBL / HDMI / I2C。
 
 规则（与你的约定一致）：
 - ';' 后面注释全部丢弃
 - M6054 "xx.png" : 只更新当前图片名（不发给 GRBL）
-- M106 S255       : 等 GRBL Idle -> 显示当前图片 -> 光机开灯
+- M106 S255       : 等 GRBL 运动走完（G4 P0 同步）-> 显示当前图片 -> 光机开灯
 - M106 S0         : 光机关灯 -> 黑屏
 - G4 Pxxxx        : 树莓派 sleep(xxxx/1000)
-- 其它            : 发给 GRBL，等待 ok/error
+- 其它            : 发给 GRBL（连续的多行按字符计数协议流式发送）
 
 注意：
-- GRBL 的 'ok' 不等于“走完”，所以在真正曝光（M106 S255）前要 wait_until_idle()
+- GRBL 的 'ok' 不等于“走完”，所以在真正曝光（M106 S255）前要 wait_until_idle_via_sync()
 """
 
 from __future__ import annotations
 
+import logging
+import mmap
 import os
+import pickle
 import re
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
 
 from grbl_client import GrblClient
 from display_control import HdmiDisplay
 from projector_control import DlpProjector
 
+log = logging.getLogger("furdlp")
 
-_RE_M6054 = re.compile(r"^M6054\s+\"?([^\"\s]+)\"?\s*$", re.IGNORECASE)
-_RE_M106 = re.compile(r"^M106\s+S([0-9\.]+)\s*$", re.IGNORECASE)
-_RE_G4P = re.compile(r"^G4\s+P([0-9\.]+)\s*$", re.IGNORECASE)
+# 只匹配指令后面的参数部分（指令字本身在 _compile_lines 里按第一个单词查表分发）
+# gcode 按 bytes 解析（不解码），所以正则也是 bytes
+_RE_M6054 = re.compile(rb"^\"?([^\"\s]+)\"?\s*$", re.IGNORECASE)
+_RE_M106 = re.compile(rb"^S([0-9\.]+)\s*$", re.IGNORECASE)
+_RE_G4P = re.compile(rb"^P([0-9\.]+)\s*$", re.IGNORECASE)
+
+# M6054 里认得的图片后缀；别的（包括没写后缀）一律补 .png
+_IMG_EXTS = frozenset({".png", ".bmp", ".jpg", ".jpeg"})
+
+# 解析结果缓存：<gcode>.plan.pkl；操作格式变了就改版本号，旧缓存自动失效
+_PLAN_CACHE_SUFFIX = ".plan.pkl"
+_PLAN_VERSION = 3
 
 
 @dataclass
@@ -40,6 +56,20 @@ class RunStats:
     image_select_count: int = 0
 
 
+# 运行时计数放在一个 array('Q') 里，下标顺序和 RunStats 的字段顺序一致
+_C_LINES_TOTAL = 0
+_C_GRBL_SENT = 1
+_C_DWELL = 2
+_C_EXPOSURE_ON = 3
+_C_EXPOSURE_OFF = 4
+_C_IMAGE_SELECT = 5
+_N_COUNTERS = 6
+
+
+def _new_counters() -> array:
+    return array("Q", bytes(8 * _N_COUNTERS))
+
+
 class GcodeExecutor:
     def __init__(
         self,
@@ -49,10 +79,10 @@ class GcodeExecutor:
         image_dir: str,
         dry_run: bool = False,
         idle_timeout_s: float = 180.0,
-        idle_poll_s: float = 0.10,
         event_pump_hz: int = 30,
         post_exposure_black_delay_s: float = 0.0,
         pre_exposure_black_delay_s: float = 0.0, 
+        overlap_post_exposure_moves: bool = False,
     ):
         self.grbl = grbl
         self.display = display
@@ -60,151 +90,248 @@ class GcodeExecutor:
         self.image_dir = image_dir
         self.dry_run = dry_run
         self.idle_timeout_s = idle_timeout_s
-        self.idle_poll_s = idle_poll_s
         self.event_pump_hz = event_pump_hz
         self.post_exposure_black_delay_s = float(post_exposure_black_delay_s)
         self._exposure_active = False
         self.pre_exposure_black_delay_s = float(pre_exposure_black_delay_s)
+        # True：曝光后的黑屏等待不阻塞后面的 GRBL 运动，剩余时间在下一次 M106 S255 前补足
+        self.overlap_post_exposure_moves = overlap_post_exposure_moves
+        self._post_delay_deadline = 0.0
 
-
+        # I2C 关灯放到后台线程，和主线程的 pygame 黑屏同时进行（pygame 只能在主线程用）
+        self._io_pool = ThreadPoolExecutor(max_workers=1)
+        # M6054 选图后在后台解码下一张图片，和 GRBL 运动重叠；曝光时只剩 blit
+        self._decoder_pool = ThreadPoolExecutor(max_workers=1)
+        self._preload_future = None
 
         self.current_image: Optional[str] = None
-        self.stats = RunStats()
+        self._counters = _new_counters()
+
+        # 树莓派侧的“工艺指令”：第一个单词（大写）-> 解析函数（参数是剩下的部分），
+        # 解析成功返回一条操作 tuple，失败返回 None（当作普通 GRBL 行）
+        self._dispatch = {
+            b"M6054": self._handle_m6054_parsed,
+            b"M106": self._handle_m106_parsed,
+            b"G4": self._handle_g4_parsed,
+        }
+        # 执行阶段：操作类型 -> 执行函数
+        self._run_ops = {
+            "grbl": self._send_to_grbl,
+            "img": self._run_select_image,
+            "expose_on": self._run_expose_on,
+            "expose_off": self._run_expose_off,
+            "dwell": self._run_dwell,
+        }
+
+    @property
+    def stats(self) -> RunStats:
+        """当前计数的只读快照。"""
+        return RunStats(*self._counters)
+
+    def close(self) -> None:
+        self._io_pool.shutdown(wait=True)
+        self._decoder_pool.shutdown(wait=True)
+
+    def _off_and_black(self) -> None:
+        """关灯 + 黑屏：I2C 在后台线程发，黑屏在主线程画，两者都完成才返回。"""
+        off_future = self._io_pool.submit(self.projector.off)
+        self.display.black()
+        off_future.result()
+
+    def _wait_post_delay_remaining(self) -> None:
+        """补足上一层还没等完的曝光后黑屏时间（只在 overlap 模式下会有剩余）。"""
+        remaining = self._post_delay_deadline - time.monotonic()
+        if remaining > 0:
+            log.info("[M106] 补足曝光后黑屏等待 %.2f s", remaining)
+            self.display.sleep_only(remaining)
 
     @staticmethod
-    def _strip_comment(line: str) -> str:
-        if ";" in line:
-            line = line.split(";", 1)[0]
-        return line.strip()
+    def _strip_comment(line: bytes) -> bytes:
+        return line.partition(b";")[0].strip()
 
-    def _handle_m6054(self, line: str) -> bool:
-        m = _RE_M6054.match(line)
+    def _handle_m6054_parsed(self, rest: bytes) -> Optional[tuple]:
+        m = _RE_M6054.match(rest)
         if not m:
-            return False
-        name = m.group(1)
+            return None
+        name = m.group(1).decode("utf-8", errors="ignore")
         # 允许 gcode 里只写 12 或 12.png，两种都兼容
-        if not name.lower().endswith(".png") and not name.lower().endswith(".bmp") and not name.lower().endswith(".jpg") and not name.lower().endswith(".jpeg"):
+        if os.path.splitext(name)[1].lower() not in _IMG_EXTS:
             name = name + ".png"
-        self.current_image = os.path.join(self.image_dir, name)
-        self.stats.image_select_count += 1
-        print(f"[M6054] 选择图片: {self.current_image}")
-        return True
+        return ("img", os.path.join(self.image_dir, name))
 
-    def _handle_m106(self, line: str) -> bool:
-        m = _RE_M106.match(line)
+    def _handle_m106_parsed(self, rest: bytes) -> Optional[tuple]:
+        m = _RE_M106.match(rest)
         if not m:
-            return False
+            return None
         s_val = float(m.group(1))
         if s_val >= 1.0:  # 约定：S255 表示“开灯+显示”
-            # S>=1：开始曝光（显示图片 + 开灯）
-            self.stats.exposure_on_count += 1
-
-            if self.current_image is None:
-                raise RuntimeError("收到 M106 S255 但还没有 M6054 选择图片")
-
-            print(f"[M106] 开始曝光：{self.current_image}")
-            if not self.dry_run:
-                # 1) 确保电机已停（你原来就有）
-                self.grbl.wait_until_idle(timeout_s=self.idle_timeout_s, poll_s=self.idle_poll_s)
-
-                # 2) 曝光前：强制黑屏+关灯，再等待 1~2 秒
-                self.projector.off()
-                self.display.black()
-                if self.pre_exposure_black_delay_s > 0:
-                    print(f"[M106] 曝光前黑屏等待 {self.pre_exposure_black_delay_s:.2f} s")
-                    self.display.sleep_with_pump(self.pre_exposure_black_delay_s)
-
-                # 3) 开始本层曝光：显示图片 + 开灯
-                self.display.show(self.current_image)
-                self.projector.on()
-            else:
-                print("[DRY_RUN] would wait_until_idle()")
-                print("[DRY_RUN] would projector.off() and display.black()")
-                if self.pre_exposure_black_delay_s > 0:
-                    print(f"[DRY_RUN] would sleep {self.pre_exposure_black_delay_s:.2f}s")
-                print("[DRY_RUN] would display.show(current_image) and projector.on()")
-
-            return True
-
-            """
-            self.stats.exposure_on_count += 1
-            if self.current_image is None:
-                raise RuntimeError("遇到 M106 S255 但还没有 M6054 选择图片")
-
-            print("[M106] 准备曝光：等待 GRBL Idle...")
-            if not self.dry_run:
-                self.grbl.wait_until_idle(timeout_s=self.idle_timeout_s, poll_s=self.idle_poll_s)
-                self.display.show(self.current_image)
-                self.projector.on()
-                self._exposure_active = True
-            else:
-                print(f"[DRY_RUN] would show {self.current_image} and projector.on()")
-            return True
-            """
+            return ("expose_on",)
+        return ("expose_off",)
 
+    def _handle_g4_parsed(self, rest: bytes) -> Optional[tuple]:
+        m = _RE_G4P.match(rest)
+        if not m:
+            return None
+        return ("dwell", float(m.group(1)) / 1000.0)
+
+    def _run_select_image(self, path: str) -> None:
+        self.current_image = path
+        self._counters[_C_IMAGE_SELECT] += 1
+        log.debug("[M6054] 选择图片: %s", path)
+        if not self.dry_run:
+            self._preload_future = self._decoder_pool.submit(self.display.preload, path)
+
+    def _run_expose_on(self) -> None:
+        # S>=1：开始曝光（显示图片 + 开灯）
+        self._counters[_C_EXPOSURE_ON] += 1
+
+        if self.current_image is None:
+            raise RuntimeError("收到 M106 S255 但还没有 M6054 选择图片")
+
+        log.info("[M106] 开始曝光：%s", self.current_image)
+        if not self.dry_run:
+            # 1) 上一层的曝光后黑屏时间要等够，并确保电机已停（你原来就有）
+            self._wait_post_delay_remaining()
+            self.grbl.wait_until_idle_via_sync(timeout_s=self.idle_timeout_s)
+
+            # 2) 曝光前：强制黑屏+关灯，再等待 1~2 秒
+            self._off_and_black()
+            if self.pre_exposure_black_delay_s > 0:
+                log.info("[M106] 曝光前黑屏等待 %.2f s", self.pre_exposure_black_delay_s)
+                self.display.sleep_only(self.pre_exposure_black_delay_s)
+
+            # 3) 开始本层曝光：显示图片 + 开灯（后台预解码还没完成就等它，免得重复解码）
+            if self._preload_future is not None:
+                self._preload_future.result()
+                self._preload_future = None
+            self.display.show(self.current_image)
+            self.projector.on()
+        else:
+            log.debug("[DRY_RUN] would wait_until_idle_via_sync()")
+            log.debug("[DRY_RUN] would projector.off() and display.black()")
+            if self.pre_exposure_black_delay_s > 0:
+                log.debug("[DRY_RUN] would sleep %.2fs", self.pre_exposure_black_delay_s)
+            log.debug("[DRY_RUN] would display.show(current_image) and projector.on()")
+
+        self._exposure_active = True
+
+    def _run_expose_off(self) -> None:
         # S0：黑屏 + 关灯
-        # S0：黑屏 + 关灯
-        self.stats.exposure_off_count += 1
+        self._counters[_C_EXPOSURE_OFF] += 1
 
         was_active = self._exposure_active  # 记录：这次 S0 是否是“曝光结束”
         self._exposure_active = False       # 无论如何，先标记为不在曝光中
 
-        print("[M106] 结束曝光：黑屏+关灯")
+        log.info("[M106] 结束曝光：黑屏+关灯")
         if not self.dry_run:
-            self.projector.off()
-            self.display.black()
+            self._off_and_black()
 
             # 只有在“刚刚确实曝光过”的情况下，才额外黑屏等待
             if was_active and self.post_exposure_black_delay_s > 0:
-                print(f"[M106] 黑屏额外等待 {self.post_exposure_black_delay_s:.2f} s")
-                self.display.sleep_with_pump(self.post_exposure_black_delay_s)
+                if self.overlap_post_exposure_moves:
+                    # 不在这里等：下一层的 GRBL 运动照常发出（GRBL 收到就开始走），
+                    # 剩余的黑屏时间在下一次 M106 S255 之前补足
+                    self._post_delay_deadline = time.monotonic() + self.post_exposure_black_delay_s
+                else:
+                    log.info("[M106] 黑屏额外等待 %.2f s", self.post_exposure_black_delay_s)
+                    self.display.sleep_only(self.post_exposure_black_delay_s)
         else:
-            print("[DRY_RUN] would projector.off() and display.black()")
+            log.debug("[DRY_RUN] would projector.off() and display.black()")
             if was_active and self.post_exposure_black_delay_s > 0:
-                print(f"[DRY_RUN] would sleep {self.post_exposure_black_delay_s:.2f}s")
-
-        return True
+                log.debug("[DRY_RUN] would sleep %.2fs", self.post_exposure_black_delay_s)
 
-    def _handle_g4(self, line: str) -> bool:
-        m = _RE_G4P.match(line)
-        if not m:
-            return False
-        ms = float(m.group(1))
-        sec = ms / 1000.0
-        self.stats.dwell_count += 1
-        print(f"[G4] dwell {ms:.0f} ms")
+    def _run_dwell(self, sec: float) -> None:
+        self._counters[_C_DWELL] += 1
+        log.debug("[G4] dwell %.0f ms", sec * 1000.0)
         if not self.dry_run:
-            self.display.sleep_with_pump(sec)
+            # 和逐行发送时一样：前面的行都被 GRBL 接收（ok）之后才开始计时
+            self.grbl.wait_pending_ok()
+            self.display.pump_for(sec)
         else:
-            print(f"[DRY_RUN] would sleep {sec:.3f}s")
-        return True
+            log.debug("[DRY_RUN] would sleep %.3fs", sec)
 
-    def _send_to_grbl(self, line: str) -> None:
+    def _send_to_grbl(self, payloads: Tuple[bytes, ...]) -> None:
+        """一段连续的 GRBL 行：流式发出去，不逐行等 ok（剩下的 ok 在下一个树莓派侧操作前收）。"""
         if self.dry_run:
-            print(f"[DRY_RUN][GRBL] {line}")
+            if log.isEnabledFor(logging.DEBUG):
+                for payload in payloads:
+                    log.debug("[DRY_RUN][GRBL] %s", payload.decode("ascii", errors="ignore").strip())
             return
-        self.grbl.send_line_wait_ok(line)
-        self.stats.gcode_lines_sent_grbl += 1
+        self.grbl.stream_lines(payloads)
+        self._counters[_C_GRBL_SENT] += len(payloads)
+
+    def _compile_lines(self, gcode_path: str) -> Tuple[int, List[tuple]]:
+        """逐行解析 gcode，返回 (总行数, 操作列表)。"""
+        plan: List[tuple] = []
+        total = 0
+        with open(gcode_path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return 0, plan
+            # 整个文件 mmap 进来按 bytes 取行：gcode 是纯 ASCII，不必逐行跑 UTF-8 解码
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for raw in iter(mm.readline, b""):
+                    total += 1
+                    line = self._strip_comment(raw)
+                    if not line:
+                        continue
+
+                    # 先处理树莓派侧的“工艺指令”：按第一个单词查表，普通运动行不跑任何正则
+                    parts = line.split(None, 1)
+                    handler = self._dispatch.get(parts[0].upper())
+                    op = handler(parts[1]) if handler is not None and len(parts) == 2 else None
+                    if op is not None:
+                        plan.append(op)
+                        continue
+
+                    # 剩下的交给 GRBL（运动/坐标等），原样就是串口要写的 bytes；
+                    # 连续的 GRBL 行合并成一个操作，执行时一起流式发送
+                    payload = line + b"\n"
+                    if plan and plan[-1][0] == "grbl":
+                        plan[-1][1].append(payload)
+                    else:
+                        plan.append(("grbl", [payload]))
+        return total, [("grbl", tuple(op[1])) if op[0] == "grbl" else op for op in plan]
+
+    def _load_plan(self, gcode_path: str) -> Tuple[int, List[tuple]]:
+        """
+        取 gcode 的操作列表：同一个文件（路径 + mtime + 图片目录都没变）再次打印时，
+        直接读旁边缓存的 <gcode>.plan.pkl，不再重新解析。
+        """
+        key = (_PLAN_VERSION, os.path.abspath(gcode_path), os.path.getmtime(gcode_path), self.image_dir)
+        cache_path = gcode_path + _PLAN_CACHE_SUFFIX
+        try:
+            with open(cache_path, "rb") as f:
+                cached_key, total, plan = pickle.load(f)
+            if cached_key == key:
+                return total, plan
+        except Exception:
+            pass
+
+        total, plan = self._compile_lines(gcode_path)
+        try:
+            with open(cache_path, "wb") as f:
+                pickle.dump((key, total, plan), f, protocol=pickle.HIGHEST_PROTOCOL)
+        except OSError as e:
+            log.warning("[GCODE] 无法写入解析缓存 %s：%s", cache_path, e)
+        return total, plan
+
+    def compile_file(self, gcode_path: str) -> List[tuple]:
+        """
+        把整个 gcode 文件一次性解析成操作列表：
+          ("grbl", (bytes, ...)) / ("img", path) / ("expose_on",) / ("expose_off",) / ("dwell", 秒)
+        """
+        return self._load_plan(gcode_path)[1]
 
     def run_file(self, gcode_path: str) -> RunStats:
-        self.stats = RunStats()
-        print(f"=== RUN GCODE: {gcode_path} ===")
-        with open(gcode_path, "r", encoding="utf-8", errors="ignore") as f:
-            for raw in f:
-                self.stats.gcode_lines_total += 1
-                line = self._strip_comment(raw)
-                if not line:
-                    continue
-
-                # 先处理树莓派侧的“工艺指令”
-                if self._handle_m6054(line):
-                    continue
-                if self._handle_m106(line):
-                    continue
-                if self._handle_g4(line):
-                    continue
-
-                # 剩下的交给 GRBL（运动/坐标等）
-                self._send_to_grbl(line)
+        self._counters = _new_counters()
+        log.info("=== RUN GCODE: %s ===", gcode_path)
+        total, plan = self._load_plan(gcode_path)
+        self._counters[_C_LINES_TOTAL] = total
 
+        run_ops = self._run_ops
+        for op in plan:
+            run_ops[op[0]](*op[1:])
+
+        if not self.dry_run:
+            self.grbl.wait_pending_ok()
         return self.stats
@@ -3,15 +3,36 @@
 
 要点：
 1) 发送一行命令 -> 等待返回 ok/error
-2) 需要“确认运动结束”时：发送 '?' 读取状态，直到 <Idle|...>
+2) 连续的运动行用 stream_lines 按“字符计数”协议连发，不必每行都等 ok
+3) 需要“确认运动结束”时：发一条 G4 P0 等它的 ok（wait_until_idle_via_sync）；
+   手动调试时也可以发送 '?' 轮询状态，直到 <Idle|...>（wait_until_idle）
 """
 
 from __future__ import annotations
 
+import logging
+import selectors
+import struct
 import time
 import serial
+from collections import deque
 from dataclasses import dataclass
-from typing import Optional
+from typing import Callable, Iterable, Optional
+
+log = logging.getLogger("furdlp")
+
+# GRBL 串口接收缓冲 128 字节，留 1 字节余量
+RX_BUFFER_SIZE = 127
+
+# Linux 串口 ioctl：读/写 struct serial_struct，flags 在第 5 个 int（偏移 16）
+_TIOCGSERIAL = 0x541E
+_TIOCSSERIAL = 0x541F
+_ASYNC_LOW_LATENCY = 0x2000
+_SERIAL_STRUCT_SIZE = 0x60
+_SERIAL_FLAGS_OFFSET = 16
+
+# 等串口数据时，最多隔这么久醒一次（调用 idle_callback、检查超时）
+_READ_POLL_S = 0.05
 
 
 @dataclass
@@ -27,14 +48,52 @@ class GrblClient:
         baudrate: int = 115200,
         timeout_s: float = 1.0,
         reset_on_open: bool = True,
+        idle_callback: Optional[Callable[[], None]] = None,
     ):
         self.ser = serial.Serial(port, baudrate=baudrate, timeout=timeout_s)
+        self._set_low_latency()
+        # 等串口回复期间没数据时调用（runner 里接 HdmiDisplay.pump_events，防止窗口假死）
+        self.idle_callback = idle_callback
+        # 已经发出、还没收到 ok 的行长度（字符计数协议），以及它们的总字节数
+        self._pending: deque = deque()
+        self._pending_bytes = 0
+        # 已经读进来、还没凑成完整行的字节
+        self._rx = bytearray()
+        # 在串口 fd 上等“可读”，有数据立刻醒，不靠 read(1) 的串口 timeout
+        self._selector = None
+        try:
+            sel = selectors.DefaultSelector()
+            sel.register(self.ser.fileno(), selectors.EVENT_READ)
+            self._selector = sel
+        except (AttributeError, ValueError, OSError):
+            pass  # 拿不到 fd（非 posix 串口），退回阻塞 read
         # Arduino 打开串口通常会复位，给它一点时间吐出欢迎信息
         if reset_on_open:
             time.sleep(2.0)
         self.drain()
 
+    def _set_low_latency(self) -> None:
+        """
+        USB 转串口（FTDI 等）默认攒 16ms 才把收到的字节交上来，每个 ok / 状态回复都要多等这么久。
+        打开 ASYNC_LOW_LATENCY 后驱动立即上报；不支持的设备（或非 Linux）就保持原样。
+        """
+        try:
+            import fcntl
+
+            fd = self.ser.fileno()
+            buf = bytearray(fcntl.ioctl(fd, _TIOCGSERIAL, bytes(_SERIAL_STRUCT_SIZE)))
+            (flags,) = struct.unpack_from("i", buf, _SERIAL_FLAGS_OFFSET)
+            if flags & _ASYNC_LOW_LATENCY:
+                return
+            struct.pack_into("i", buf, _SERIAL_FLAGS_OFFSET, flags | _ASYNC_LOW_LATENCY)
+            fcntl.ioctl(fd, _TIOCSSERIAL, bytes(buf))
+        except (ImportError, OSError, AttributeError, ValueError) as e:
+            log.warning("[GRBL] 无法设置串口 low_latency（忽略）：%s", e)
+
     def close(self) -> None:
+        if self._selector is not None:
+            self._selector.close()
+            self._selector = None
         try:
             self.ser.close()
         except Exception:
@@ -42,6 +101,14 @@ class GrblClient:
 
     def drain(self) -> None:
         """清空串口输入缓存。"""
+        self._rx = bytearray()
+        try:
+            # 一次 tcflush 丢掉内核里收到的所有字节
+            self.ser.reset_input_buffer()
+            return
+        except Exception:
+            pass
+        # 不支持 reset_input_buffer 的串口后端：退回逐块读空
         try:
             while self.ser.in_waiting:
                 self.ser.read(self.ser.in_waiting)
@@ -50,20 +117,36 @@ class GrblClient:
 
     def _readline(self, timeout_s: float = 5.0) -> str:
         """读一行（去 \r\n），超时抛异常。"""
-        t0 = time.time()
-        buf = b""
+        deadline = time.monotonic() + timeout_s
         while True:
-            if time.time() - t0 > timeout_s:
+            # 缓冲里已经有完整行就直接取（一次读进来的可能不止一行）
+            line, sep, rest = self._rx.partition(b"\n")
+            if sep:
+                self._rx = rest
+                text = line.decode("utf-8", errors="ignore").strip()
+                if text:
+                    return text
+                continue  # 空行（单独的 \r\n）：继续
+            remaining = deadline - time.monotonic()
+            if remaining < 0:
                 raise TimeoutError("GRBL 读取超时（没有收到完整行）")
-            ch = self.ser.read(1)
-            if not ch:
+            if not self._wait_fd_readable(min(remaining, _READ_POLL_S)):
+                if self.idle_callback is not None:
+                    self.idle_callback()
                 continue
-            if ch in (b"\n", b"\r"):
-                if buf:
-                    break
+            # 有多少读多少，一次系统调用拿到整行
+            chunk = self.ser.read(self.ser.in_waiting or 1)
+            if not chunk:
+                if self.idle_callback is not None:
+                    self.idle_callback()
                 continue
-            buf += ch
-        return buf.decode("utf-8", errors="ignore").strip()
+            self._rx += chunk
+
+    def _wait_fd_readable(self, timeout: float) -> bool:
+        """等串口 fd 可读，最多 timeout 秒。没有 selector 时直接返回 True（交给阻塞 read）。"""
+        if self._selector is None:
+            return True
+        return bool(self._selector.select(timeout))
 
     def write_line(self, line: str) -> None:
         """写入一行（自动加 \n）。"""
@@ -75,13 +158,19 @@ class GrblClient:
         clean = line.strip()
         if not clean:
             return ""
+        return self.send_payload_wait_ok((clean + "\n").encode("utf-8"))
 
-        self.write_line(clean)
+    def send_payload_wait_ok(self, payload: bytes, timeout_s: float = 10.0) -> str:
+        """发送已经编码好的一行（必须以 \n 结尾），并等待 ok/error 返回。"""
+        # 先把流式发送还欠着的 ok 收完，保证读到的是这一行的回复
+        self.wait_pending_ok()
+        self.ser.write(payload)
+        clean = payload.decode("utf-8", errors="ignore").strip()
 
         # 有的命令会返回多行（比如 $$），这里简单读取直到 ok 或 error
         last = ""
         while True:
-            resp = self._readline(timeout_s=10.0)
+            resp = self._readline(timeout_s=timeout_s)
             last = resp
             low = resp.lower()
             if low == "ok":
@@ -90,9 +179,90 @@ class GrblClient:
                 raise RuntimeError(f"GRBL 返回错误：{resp} （命令：{clean}）")
             # 其它行：继续读（例如 welcome banner/feedback）
 
+    def stream_lines(self, payloads: Iterable[bytes], max_bytes: int = 64) -> None:
+        """
+        字符计数协议连发多行（每行是已经编码好的 bytes，以 \n 结尾）：
+        只要 GRBL 接收缓冲还放得下就继续写，放不下时才读一个 ok 腾出空间。
+        放得下的连续几行拼起来一次 write（最多 max_bytes 字节），少几次 USB 传输。
+        返回时最后几行可能还没有 ok（在 _pending 里），需要时调用 wait_pending_ok()。
+        """
+        batch = bytearray()
+        batch_lens = []
+        for payload in payloads:
+            n = len(payload)
+            if batch and (len(batch) + n > max_bytes or self._pending_bytes + len(batch) + n > RX_BUFFER_SIZE):
+                self._write_batch(batch, batch_lens)
+                batch = bytearray()
+                batch_lens = []
+            while self._pending and self._pending_bytes + n > RX_BUFFER_SIZE:
+                self._read_one_ack()
+            batch += payload
+            batch_lens.append(n)
+        if batch:
+            self._write_batch(batch, batch_lens)
+
+    def write_lines(self, lines: Iterable[str], max_bytes: int = 64) -> None:
+        """同 stream_lines，参数是普通字符串行（自动加 \n）。"""
+        self.stream_lines(((line.strip() + "\n").encode("utf-8") for line in lines), max_bytes=max_bytes)
+
+    def _write_batch(self, batch: bytearray, lens) -> None:
+        """一次 write 发出拼好的几行，并记到 _pending 里等 ok。"""
+        self.ser.write(bytes(batch))
+        self._pending.extend(lens)
+        self._pending_bytes += len(batch)
+
+    def wait_pending_ok(self) -> None:
+        """等 stream_lines 发出的所有行都收到 ok。"""
+        while self._pending:
+            self._read_one_ack()
+
+    def _read_one_ack(self) -> None:
+        """读到一个 ok，释放最早那一行占的缓冲；error/alarm 直接抛异常。"""
+        while True:
+            resp = self._readline(timeout_s=10.0)
+            if self._account_stream_reply(resp):
+                return
+            # 其它行：继续读
+
+    def _account_stream_reply(self, resp: str) -> bool:
+        """
+        流式发送中收到的一行回复记账：ok 释放最早那一行，返回 True；
+        error 表示最早那一行执行失败，同样释放它再抛异常（后面已经发出的行照样会各回一个
+        ok/error，仍然留在 _pending 里，之后由 wait_pending_ok 收掉，回复不会错位）；
+        ALARM 不是某一行的回复，不释放任何行，直接抛异常。其它行返回 False。
+        """
+        low = resp.lower()
+        if low == "ok":
+            self._pending_bytes -= self._pending.popleft()
+            return True
+        if low.startswith("error"):
+            self._pending_bytes -= self._pending.popleft()
+            raise RuntimeError(f"GRBL 返回错误：{resp} （流式发送中）")
+        if low.startswith("alarm"):
+            raise RuntimeError(f"GRBL 返回错误：{resp} （流式发送中）")
+        return False
+
+
+    def write_realtime(self, cmd: bytes) -> None:
+        """
+        发送实时命令（'?' / '!' / '~' / Ctrl-X）：GRBL 收到这个字节就立即处理，
+        不进接收缓冲，也不回 ok，所以不能加 \n（多出来的空行会多回一个 ok）。
+        """
+        self.ser.write(cmd)
+
+    def feed_hold(self) -> None:
+        """'!' 暂停运动。"""
+        self.write_realtime(b"!")
+
+    def cycle_start(self) -> None:
+        """'~' 继续运动。"""
+        self.write_realtime(b"~")
+
     def soft_reset(self) -> None:
         """软复位 Ctrl-X。"""
-        self.ser.write(b"\x18")
+        self.write_realtime(b"\x18")
+        self._pending.clear()
+        self._pending_bytes = 0
         time.sleep(0.5)
         self.drain()
 
@@ -106,8 +276,15 @@ class GrblClient:
 
     def get_status(self) -> GrblStatus:
         """发送 '?' 获取状态，返回解析结果。"""
-        self.write_line("?")
-        line = self._readline(timeout_s=2.0)
+        self.write_realtime(b"?")
+        deadline = time.monotonic() + 2.0
+        while True:
+            line = self._readline(timeout_s=max(0.0, deadline - time.monotonic()))
+            if line.startswith("<"):
+                break
+            # 流式发送中，状态行前面可能先到几个 ok/error：照常记账，继续等状态行
+            if self._pending:
+                self._account_stream_reply(line)
         # 典型格式：<Idle|MPos:0.000,0.000,0.000|FS:0,0>
         state = None
         if line.startswith("<") and "|" in line:
@@ -117,15 +294,31 @@ class GrblClient:
                 state = None
         return GrblStatus(raw=line, state=state)
 
+    def wait_until_idle_via_sync(self, timeout_s: float = 120.0) -> None:
+        """
+        阻塞直到运动结束，不轮询 '?'：发一条 G4 P0 当“同步点”，
+        GRBL 要等规划器里前面的运动全部走完才会回它的 ok。
+        """
+        self.send_payload_wait_ok(b"G4 P0\n", timeout_s=timeout_s)
+
     def wait_until_idle(self, timeout_s: float = 120.0, poll_s: float = 0.10) -> None:
-        """阻塞直到状态为 Idle。"""
-        t0 = time.time()
+        """
+        阻塞直到状态为 Idle（先等流式发送的行全部收到 ok），靠 '?' 轮询。
+        打印流程里用 wait_until_idle_via_sync()；这个留给手动调试/诊断，
+        区别是它按状态判断，GRBL 处于 Alarm 时会立即报错。
+        """
+        self.wait_pending_ok()
+        t0 = time.monotonic()
+        next_t = t0
         while True:
             st = self.get_status()
             if st.state == "Idle":
                 return
             if st.state == "Alarm":
                 raise RuntimeError(f"GRBL 处于 ALARM：{st.raw}")
-            if time.time() - t0 > timeout_s:
+            now = time.monotonic()
+            if now - t0 > timeout_s:
                 raise TimeoutError(f"等待 GRBL Idle 超时。最后状态：{st.raw}")
-            time.sleep(poll_s)
+            # 按固定节拍查询：下一次的时刻从上一次算起，读状态花的时间不会累加进间隔
+            next_t += poll_s
+            time.sleep(max(0.0, next_t - now))
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""切片图层路径：列出一个目录里的 1.png / 2.png / 10.png ... 并按数字排序。
+
+main_for_once.py 等脚本共用这一份，不各写一遍。
+"""
+
+from __future__ import annotations
+
+import os
+from typing import List
+
+
+def get_layer_paths(folder: str) -> List[str]:
+    """
+    返回 folder 里所有 .png 图片的完整路径，按文件名前面的数字排序。
+    假设文件名形如：1.png, 2.png, 10.png, 101.png ...
+    目录不存在时抛 FileNotFoundError；没有图片时返回空列表。
+    """
+    # scandir 的 DirEntry 自带完整路径，不用再 os.path.join；每个数字只解析一次
+    with os.scandir(folder) as it:
+        entries = [
+            (int(e.name.partition(".")[0]), e.path)
+            for e in it
+            if e.name.lower().endswith(".png") and e.is_file()
+        ]
+    entries.sort()
+    return [p for _, p in entries]
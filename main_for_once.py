@@ -1,8 +1,9 @@
-import os
 import sys
+import threading
 import time
 
 import exposure  # 你之前写好的模块：init_display / start_exposure / stop_exposure / close_display
+from layer_paths import get_layer_paths as scan_layer_paths  # 图层路径列表 + 数字排序（和其它脚本共用）
 
 
 # ============ 配置区域（默认参数） ============
@@ -19,31 +20,19 @@ DISPLAY_INDEX    = 1      # 使用的显示器编号（0/1）
 def get_layer_paths(folder):
     """
     从给定文件夹中找到所有 .png 图片，
-    按“数字大小”排序，返回完整路径列表。
-    假设文件名形如:1.png, 2.png, 10.png, 101.png ...
+    按“数字大小”排序，返回完整路径列表（见 layer_paths.py）。
+    找不到目录或没有图片时直接退出。
     """
     try:
-        files = os.listdir(folder)
+        layer_paths = scan_layer_paths(folder)
     except FileNotFoundError:
         print(f"错误：找不到目录 {folder}")
         sys.exit(1)
 
-    # 只要 .png
-    image_files = [f for f in files if f.lower().endswith(".png")]
-    if not image_files:
+    if not layer_paths:
         print(f"错误：目录 {folder} 中没有找到任何 .png 图片")
         sys.exit(1)
 
-    # 按数字排序，例如 1,2,10,11...
-    def numeric_key(name):
-        base, _ = os.path.splitext(name)  # "12.png" -> "12"
-        return int(base)                  # "12" -> 12
-
-    image_files.sort(key=numeric_key)
-
-    # 拼完整路径
-    layer_paths = [os.path.join(folder, f) for f in image_files]
-
     print("将按以下顺序播放图片：")
     for p in layer_paths:
         print("  ", p)
@@ -74,6 +63,33 @@ def expose_one_layer(path, exposure_time, dark_time):
     if dark_time > 0:
         time.sleep(dark_time)
 
+def expose_one_layer_overlapped(path, next_path, exposure_time, dark_time):
+    """
+    和 expose_one_layer 一样的单层流程，但曝光等待的这段时间里，
+    后台线程顺便把下一层图片 next_path 解码进缓存（next_path 为 None 表示没有下一层）。
+    曝光/黑屏都按截止时刻等待，解码花掉的时间不会叠加到曝光时间上。
+    """
+    # 1) 开始曝光，并立刻记下曝光结束的时刻
+    exposure.start_exposure(path)
+    deadline = time.monotonic() + exposure_time
+
+    # 2) 曝光期间后台解码下一层
+    worker = None
+    if next_path is not None:
+        worker = threading.Thread(target=exposure.preload_image, args=(next_path,), daemon=True)
+        worker.start()
+
+    # 3) 睡到截止时刻，停止曝光：黑屏
+    time.sleep(max(0.0, deadline - time.monotonic()))
+    exposure.stop_exposure()
+    deadline = time.monotonic() + dark_time
+
+    # 4) 确保下一层已经解码好，再把黑屏时间等够
+    if worker is not None:
+        worker.join()
+    if dark_time > 0:
+        time.sleep(max(0.0, deadline - time.monotonic()))
+
 # ============ 核心函数：只控制 HDMI 曝光 ============
 
 def run_sequence(folder,
@@ -112,7 +128,8 @@ def run_sequence(folder,
         else:
             current_exposure = normal_exposure
 
-        expose_one_layer(path, current_exposure, dark_time)
+        next_path = layer_paths[idx] if idx < total_layers else None
+        expose_one_layer_overlapped(path, next_path, current_exposure, dark_time)
 
     # 结束后关闭显示
     exposure.close_display()
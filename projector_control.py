@@ -40,6 +40,8 @@ class DlpProjector:
     def __init__(self, cfg: ProjectorConfig):
         self.cfg = cfg
         self._ready = False
+        # 最近一次让 LED 处于的状态：True 亮 / False 灭 / None 不知道；和要求相同就不再发 I2C
+        self._state: Optional[bool] = None
 
     def init(self) -> None:
         """初始化光机：设置外部视频输入 + 蓝光模式 +（可选）设置亮度。"""
@@ -60,16 +62,23 @@ class DlpProjector:
 
         # 默认先关灯，避免误曝光
         dlp.dlp_all_leds_off()
+        self._state = False
         self._ready = True
 
     def on(self) -> None:
         if not self.cfg.enabled:
             return
         self.init()
+        if self._state is True:
+            return
         dlp.dlp_enable_blue_only()
+        self._state = True
 
     def off(self) -> None:
         if not self.cfg.enabled:
             return
         self.init()
+        if self._state is False:
+            return
         dlp.dlp_all_leds_off()
+        self._state = False
@@ -10,67 +10,101 @@
     FurDLP_pi_runner/config.py
 """
 
+import logging
+import logging.handlers
+import queue
+import sys
+
 from config import Settings
 from grbl_client import GrblClient
 from display_control import HdmiDisplay
 from projector_control import DlpProjector, ProjectorConfig
 from gcode_executor import GcodeExecutor
 
+log = logging.getLogger("furdlp")
+
+
+def _setup_logging(level: int) -> logging.handlers.QueueListener:
+    """
+    "furdlp" 日志经队列交给后台线程写 stdout，打印循环里不会卡在终端 I/O 上。
+    返回 listener，结束时 stop() 把剩下的日志写完。
+    """
+    q = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(q, logging.StreamHandler(sys.stdout))
+    root = logging.getLogger()
+    root.addHandler(logging.handlers.QueueHandler(q))
+    logging.getLogger("furdlp").setLevel(level)
+    listener.start()
+    return listener
+
 
 def main() -> None:
     cfg = Settings()
-
-    # 1) 初始化 GRBL 串口
-    grbl = GrblClient(
-        port=cfg.SERIAL_PORT,
-        baudrate=cfg.BAUDRATE,
-        timeout_s=cfg.SERIAL_TIMEOUT_S,
-        reset_on_open=cfg.SERIAL_RESET_ON_OPEN,
-    )
-
-    if not cfg.DRY_RUN:
-        if cfg.UNLOCK_BEFORE_PRINT:
-            grbl.unlock()
-        if cfg.HOME_BEFORE_PRINT:
-            grbl.home()
-    else:
-        print("[DRY_RUN] skip unlock/home")
-
-    # 2) 初始化 HDMI 显示
-    display = HdmiDisplay(display_index=cfg.DISPLAY_INDEX, event_pump_hz=cfg.EVENT_PUMP_HZ)
-    display.init()
-    display.black()
-
-    # 3) 初始化光机（I2C）
-    projector = DlpProjector(ProjectorConfig(
-        enabled=cfg.PROJECTOR_ENABLED and (not cfg.DRY_RUN),
-        blue_brightness_percent=cfg.BLUE_BRIGHTNESS_PERCENT,
-    ))
-    projector.init()
-    projector.off()
-
-    # 4) 执行 gcode
-    executor = GcodeExecutor(
-        grbl=grbl,
-        display=display,
-        projector=projector,
-        image_dir=cfg.IMAGE_DIR,
-        dry_run=cfg.DRY_RUN,
-        idle_timeout_s=cfg.GRBL_IDLE_TIMEOUT_S,
-        idle_poll_s=cfg.GRBL_STATUS_POLL_S,
-        event_pump_hz=cfg.EVENT_PUMP_HZ,
-        post_exposure_black_delay_s=cfg.POST_EXPOSURE_BLACK_DELAY_S,
-        pre_exposure_black_delay_s=cfg.PRE_EXPOSURE_BLACK_DELAY_S,
-
-    )
-    stats = executor.run_file(cfg.GCODE_FILE)
-
-    # 5) 收尾
-    projector.off()
-    display.black()
-    display.sleep_with_pump(2.0)
-    display.close()
-    grbl.close()
+    # DRY_RUN 就是为了看每一行怎么处理，所以强制 DEBUG
+    log_listener = _setup_logging(logging.DEBUG if cfg.DRY_RUN else getattr(logging, cfg.LOG_LEVEL))
+
+    # 日志在后台线程输出：无论怎么退出都要 stop()，把队列里剩下的日志写完
+    try:
+        # 1) 初始化 GRBL 串口
+        grbl = GrblClient(
+            port=cfg.SERIAL_PORT,
+            baudrate=cfg.BAUDRATE,
+            timeout_s=cfg.SERIAL_TIMEOUT_S,
+            reset_on_open=cfg.SERIAL_RESET_ON_OPEN,
+        )
+
+        if not cfg.DRY_RUN:
+            if cfg.UNLOCK_BEFORE_PRINT:
+                grbl.unlock()
+            if cfg.HOME_BEFORE_PRINT:
+                grbl.home()
+        else:
+            log.info("[DRY_RUN] skip unlock/home")
+
+        # 2) 初始化 HDMI 显示
+        display = HdmiDisplay(
+            display_index=cfg.DISPLAY_INDEX,
+            event_pump_hz=cfg.EVENT_PUMP_HZ,
+            video_driver=cfg.SDL_VIDEO_DRIVER,
+        )
+        display.init()
+        display.black()
+        # GRBL 长时间运动等 ok 时也要处理窗口事件，避免窗口假死
+        grbl.idle_callback = display.pump_events
+
+        # 3) 初始化光机（I2C）
+        projector = DlpProjector(ProjectorConfig(
+            enabled=cfg.PROJECTOR_ENABLED and (not cfg.DRY_RUN),
+            blue_brightness_percent=cfg.BLUE_BRIGHTNESS_PERCENT,
+        ))
+        projector.init()
+        projector.off()
+
+        # 4) 执行 gcode
+        executor = GcodeExecutor(
+            grbl=grbl,
+            display=display,
+            projector=projector,
+            image_dir=cfg.IMAGE_DIR,
+            dry_run=cfg.DRY_RUN,
+            idle_timeout_s=cfg.GRBL_IDLE_TIMEOUT_S,
+            event_pump_hz=cfg.EVENT_PUMP_HZ,
+            post_exposure_black_delay_s=cfg.POST_EXPOSURE_BLACK_DELAY_S,
+            pre_exposure_black_delay_s=cfg.PRE_EXPOSURE_BLACK_DELAY_S,
+            overlap_post_exposure_moves=cfg.OVERLAP_POST_EXPOSURE_MOVES,
+        )
+        try:
+            stats = executor.run_file(cfg.GCODE_FILE)
+        finally:
+            # 5) 收尾（出错退出时也要关灯、黑屏、关串口）
+            executor.close()
+            projector.off()
+            display.black()
+            display.pump_for(2.0)
+            display.close()
+            grbl.close()
+    finally:
+        log_listener.stop()
 
     print("\n=== DONE ===")
     print(stats)
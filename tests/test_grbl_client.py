@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""GrblClient 流式发送的回复记账：用 pty 模拟一个 GRBL（每收到一行回一个 ok / error:20）。"""
+
+import os
+import sys
+import threading
+import time
+import tty
+
+import pytest
+
+pytest.importorskip("serial")
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from grbl_client import GrblClient  # noqa: E402
+
+
+class FakeGrbl:
+    """pty 主端：按行读取命令，含 BAD 的行回 error:20，其它回 ok。"""
+
+    def __init__(self):
+        self.master, slave = os.openpty()
+        tty.setraw(slave)
+        self.port = os.ttyname(slave)
+        self._slave = slave
+        self.received = []
+        self._stop = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        buf = b""
+        while not self._stop:
+            try:
+                buf += os.read(self.master, 256)
+            except OSError:
+                return
+            while b"\n" in buf:
+                line, buf = buf.split(b"\n", 1)
+                self.received.append(line)
+                time.sleep(0.005)  # 模拟执行时间：回复晚于发送
+                os.write(self.master, b"error:20\r\n" if b"BAD" in line else b"ok\r\n")
+
+    def close(self):
+        self._stop = True
+        os.close(self.master)
+        os.close(self._slave)
+
+
+@pytest.fixture
+def grbl():
+    fake = FakeGrbl()
+    client = GrblClient(fake.port, reset_on_open=False, timeout_s=0.1)
+    yield client, fake
+    client.close()
+    fake.close()
+
+
+def test_error_mid_stream_keeps_later_acks_in_order(grbl):
+    client, fake = grbl
+    client.stream_lines([b"G1 X1\n", b"BAD\n", b"G1 X2\n", b"G1 X3\n"])
+
+    with pytest.raises(RuntimeError, match="error:20"):
+        client.wait_pending_ok()
+    # 只释放了 ok 的那一行和出错的那一行，后面两行还在等 ok
+    assert len(client._pending) == 2
+
+    assert client.send_line_wait_ok("G0 Z1") == "ok"
+    assert fake.received[-1] == b"G0 Z1"
+    assert not client._pending and client._pending_bytes == 0
+
+    # 没有遗留的回复：下一条同步命令拿到的一定是自己的 ok
+    time.sleep(0.1)
+    assert client.ser.in_waiting == 0 and not client._rx
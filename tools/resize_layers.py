@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""离线把切片图片一次性缩放到投影分辨率（打印前跑一次即可）。
+
+exposure.py 默认要求图片尺寸和屏幕完全一致（require_exact_size = True），
+运行时不再拉伸。用这个脚本提前处理整个目录：
+
+    python3 tools/resize_layers.py <源目录> <输出目录> [宽] [高] [bmp|raw|pal]
+
+    宽/高默认 1920 1080
+    最后写 bmp：输出 .bmp（pygame 加载时不用解码 PNG，更快）。
+               输出目录和源目录相同时 .bmp 放在 .png 旁边，gcode 里还是写 12.png，
+               exposure.py 会自动改用同名 .bmp
+    最后写 raw：输出 .raw（RGB888 原始像素，宽*高*3 字节）。
+               输出目录和源目录相同时 .raw 就放在 .png 旁边，
+               exposure.py 会自动优先 mmap 同名 .raw，完全跳过解码
+    最后写 pal：按亮度 128 二值化，输出 <原文件名>.pal.bmp（8-bit 两色调色板：
+               0=黑，1=蓝），数据量只有 RGB888 的 1/3；exposure.py 会最优先使用它
+
+    输出文件已经存在、不比源图旧、尺寸也对的会跳过：重新切片或换分辨率后再跑一次，
+    只处理需要更新的图片。以前输出的 .pal.bmp / 同名 .bmp 不会被当成源图。
+
+依赖：pip3 install Pillow
+"""
+
+import os
+import sys
+from multiprocessing import Pool
+
+from PIL import Image
+
+_IMG_EXTS = (".png", ".bmp", ".jpg", ".jpeg")
+
+# pal 模式的调色板：索引 0 = 黑，索引 1 = 蓝（和光机只开蓝灯一致）
+_LAYER_PALETTE = [0, 0, 0, 0, 0, 255]
+
+
+def _resize_one(job):
+    """缩放一张图片，返回输出路径。job = (src, dst, size)"""
+    src, dst, size = job
+    with Image.open(src) as img:
+        img = img.convert("RGB")
+        if img.size != size:
+            img = img.resize(size, Image.LANCZOS)
+        if dst.endswith(".pal.bmp"):
+            # 像素值就是调色板索引：>=128 -> 1（蓝），否则 0（黑）
+            img = img.convert("L").point(lambda v: 1 if v >= 128 else 0)
+            img.putpalette(_LAYER_PALETTE)
+            img.save(dst)
+        elif dst.endswith(".raw"):
+            with open(dst, "wb") as f:
+                f.write(img.tobytes())
+        else:
+            img.save(dst)
+    return dst
+
+
+def _up_to_date(src, dst, size):
+    """dst 已经存在、不比 src 旧，而且就是 size 这个尺寸。"""
+    try:
+        if os.path.getmtime(dst) < os.path.getmtime(src):
+            return False
+        if dst.endswith(".raw"):
+            return os.path.getsize(dst) == size[0] * size[1] * 3
+        with Image.open(dst) as img:
+            return img.size == size
+    except (OSError, ValueError):
+        return False
+
+
+def _is_own_output(name, lower_names):
+    """这个文件是本脚本以前的输出（<图>.pal.bmp，或 PNG 等旁边同名的 .bmp），不能再当源图。"""
+    low = name.lower()
+    if low.endswith(".pal.bmp"):
+        return True
+    base, ext = os.path.splitext(low)
+    return ext == ".bmp" and any(base + e in lower_names for e in _IMG_EXTS if e != ".bmp")
+
+
+def resize_dir(src_dir, dst_dir, size=(1920, 1080), out_format=None):
+    """
+    把 src_dir 里所有图片缩放到 size，写到 dst_dir（多进程并行）。
+    out_format: None 保持原格式；"bmp" / "raw" / "pal" 见文件开头说明。
+    """
+    os.makedirs(dst_dir, exist_ok=True)
+
+    jobs = []
+    skipped = 0
+    names = sorted(os.listdir(src_dir))
+    lower_names = {n.lower() for n in names}
+    for name in names:
+        base, ext = os.path.splitext(name)
+        if ext.lower() not in _IMG_EXTS or _is_own_output(name, lower_names):
+            continue
+        if out_format == "pal":
+            out_name = name + ".pal.bmp"
+        else:
+            out_name = base + ("." + out_format if out_format else ext)
+        src = os.path.join(src_dir, name)
+        dst = os.path.join(dst_dir, out_name)
+        if _up_to_date(src, dst, size):
+            skipped += 1
+            continue
+        jobs.append((src, dst, size))
+
+    with Pool() as pool:
+        for dst in pool.imap_unordered(_resize_one, jobs):
+            print(f"[resize] {dst}")
+
+    print(f"完成：处理 {len(jobs)} 张，跳过 {skipped} 张（已是最新），输出到 {dst_dir}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print(__doc__)
+        sys.exit(1)
+
+    src_dir = sys.argv[1]
+    dst_dir = sys.argv[2]
+    width = int(sys.argv[3]) if len(sys.argv) >= 4 else 1920
+    height = int(sys.argv[4]) if len(sys.argv) >= 5 else 1080
+    out_format = sys.argv[5].lower() if len(sys.argv) >= 6 else None
+    if out_format not in (None, "bmp", "raw", "pal"):
+        print(f"未知输出格式：{out_format}（只支持 bmp / raw / pal）")
+        sys.exit(1)
+
+    resize_dir(src_dir, dst_dir, (width, height), out_format)